@@ -0,0 +1,147 @@
+import threading
+
+import numpy as np
+
+from scoring import SIMILARITY_THRESHOLD, normalize_rows, score_block
+
+IVF_MIN_PARTITION = 2048  # smaller categories are searched exhaustively
+IVF_TRAIN_ITERATIONS = 10
+REBUILD_PENDING = 1024    # online additions buffered before a partition is re-laid out
+
+
+def train_ivf(embeddings, nlist, iterations=IVF_TRAIN_ITERATIONS, seed=0):
+    """Spherical k-means on unit vectors; returns (centroids, assignment)."""
+    rng = np.random.default_rng(seed)
+    centroids = embeddings[rng.choice(len(embeddings), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(embeddings @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, embeddings)
+        empty = ~sums.any(axis=1)
+        sums[empty] = centroids[empty]  # keep empty lists where they were
+        centroids = normalize_rows(sums)
+    assign = np.argmax(embeddings @ centroids.T, axis=1)
+    return centroids, assign
+
+
+class CategoryPartition:
+    """Non-boycotted products of one category: unit embeddings, packed keyword bits and an IVF layout."""
+
+    def __init__(self, ids, embeddings, bits):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.embeddings = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        self.bits = np.asarray(bits, dtype=np.uint8)
+        self.removed = set()
+        self.pending = []  # (id, unit embedding, bits) added since the last layout
+        self.centroids = None
+        self.lists = None
+        if len(self.ids) >= IVF_MIN_PARTITION:
+            nlist = int(np.sqrt(len(self.ids)))
+            self.centroids, assign = train_ivf(self.embeddings, nlist)
+            order = np.argsort(assign, kind="stable")
+            bounds = np.searchsorted(assign[order], np.arange(nlist + 1))
+            self.lists = [order[bounds[c]:bounds[c + 1]] for c in range(nlist)]
+
+    def __len__(self):
+        return len(self.ids) + len(self.pending) - len(self.removed)
+
+    def add(self, product_id, embedding, bits):
+        self.removed.discard(product_id)
+        self.pending.append((product_id, normalize_rows(np.asarray(embedding, dtype=np.float32).reshape(1, -1))[0],
+                             np.asarray(bits, dtype=np.uint8)))
+        if len(self.pending) >= REBUILD_PENDING:
+            ids, embs, bits = self.candidates(None, 0, exact=True)
+            self.__init__(ids, embs, bits)
+
+    def remove(self, product_id):
+        self.removed.add(product_id)
+        self.pending = [p for p in self.pending if p[0] != product_id]
+
+    def candidates(self, query, nprobe, exact=False):
+        """(ids, unit embeddings, bits) of the products in the probed IVF lists plus pending additions."""
+        if exact or self.lists is None:
+            ids, embs, bits = self.ids, self.embeddings, self.bits
+        else:
+            probe = np.argsort(-(self.centroids @ query))[:nprobe]
+            rows = np.sort(np.concatenate([self.lists[c] for c in probe]))
+            ids, embs, bits = self.ids[rows], self.embeddings[rows], self.bits[rows]
+        # Pending additions are always scanned exhaustively
+        if self.pending:
+            p_ids, p_embs, p_bits = zip(*self.pending)
+            ids = np.concatenate([ids, np.asarray(p_ids, dtype=np.int64)])
+            embs = np.vstack([embs, p_embs])
+            bits = np.vstack([bits, p_bits])
+        if self.removed:
+            keep = ~np.isin(ids, list(self.removed))
+            ids, embs, bits = ids[keep], embs[keep], bits[keep]
+        return ids, embs, bits
+
+
+class AlternativeIndex:
+    """Per-category ANN over non-boycotted products, scored like match.py."""
+
+    def __init__(self, partitions, keywords, term_index, version=None, nprobe=8, candidates=100):
+        self.partitions = partitions
+        self.keywords = keywords
+        self.term_index = term_index
+        self.version = version
+        self.nprobe = nprobe
+        self.n_candidates = candidates
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, products, embeddings, bits, keywords, term_index, **kwargs):
+        """products: rows with product_id, category (normalized) and is_boycotted, aligned with embeddings/bits."""
+        by_category = {}
+        for i, p in enumerate(products):
+            if not p['is_boycotted']:
+                by_category.setdefault(p['category'], []).append(i)
+        partitions = {}
+        for category, rows in by_category.items():
+            rows = np.asarray(rows)
+            partitions[category] = CategoryPartition(
+                [products[i]['product_id'] for i in rows], embeddings[rows], bits[rows]
+            )
+        return cls(partitions, keywords, term_index, **kwargs)
+
+    def __len__(self):
+        return sum(len(p) for p in self.partitions.values())
+
+    def add(self, category, product_id, embedding, bits):
+        with self._lock:
+            partition = self.partitions.get(category)
+            if partition is None:
+                self.partitions[category] = CategoryPartition([product_id], [embedding], [bits])
+            else:
+                partition.add(product_id, embedding, bits)
+
+    def remove(self, category, product_id):
+        with self._lock:
+            partition = self.partitions.get(category)
+            if partition is not None:
+                partition.remove(product_id)
+
+    def alternatives(self, category, embedding, bits, exact=False):
+        """[(product_id, combined, cos, jac), ...] at or above the threshold, best first.
+
+        Candidates are the nearest products by cosine (all of them when exact),
+        rescored with the combined cosine/Jaccard similarity.
+        """
+        with self._lock:
+            partition = self.partitions.get(category)
+            if partition is None:
+                return []
+            query = normalize_rows(np.asarray(embedding, dtype=np.float32).reshape(1, -1))
+            q_bits = np.asarray(bits, dtype=np.uint8).reshape(1, -1)
+            ids, embs, c_bits = partition.candidates(query[0], self.nprobe, exact)
+        if not exact and len(ids) > self.n_candidates:
+            top = np.sort(np.argpartition(-(embs @ query[0]), self.n_candidates)[:self.n_candidates])
+            ids, embs, c_bits = ids[top], embs[top], c_bits[top]
+        combined, cos, jac = score_block(
+            query, q_bits, np.bitwise_count(q_bits).sum(axis=1, dtype=np.int32),
+            embs, c_bits, np.bitwise_count(c_bits).sum(axis=1, dtype=np.int32),
+        )
+        combined, cos, jac = combined[0], cos[0], jac[0]
+        hits = np.nonzero(combined >= SIMILARITY_THRESHOLD)[0]
+        hits = hits[np.argsort(-combined[hits], kind="stable")]
+        return [(int(ids[h]), float(combined[h]), float(cos[h]), float(jac[h])) for h in hits]
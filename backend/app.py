@@ -1,17 +1,63 @@
+import time
+_import_start = time.perf_counter()
+
 from flask import Flask, request, jsonify, send_from_directory
-from ultralytics import YOLO
-import mysql.connector
 from mysql.connector import Error
-from PIL import Image
-import io
-import requests
+import hmac
+import logging
 import os
+import sys
 from flask_cors import CORS
 
+# Embedding store, keyword features and scoring are shared with scripts/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from db_pool import ConnectionPool, PoolTimeout
+from catalog_cache import CatalogCache
+from search_index import SearchIndex, normalize
+from inference import BatchScheduler, QueueFull
+from online_matcher import OnlineMatcher
+from preprocess import ImagePreprocessor, ImageTooLarge, InvalidImage
+from result_cache import ResultCache, dhash
+from model_loader import ModelLoader
+from worker_pool import InferencePool, WorkerCrashed
+from metrics import Registry, RequestTimer, SlowRequestProfiler, server_timing
+from http_cache import REVALIDATE, ResponseCache, StaticAssets, make_payload, send_payload
+
 # Setup Flask app
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), '..', 'static'))
 CORS(app, resources={r"/*": {"origins": "*"}})
 
+# Prometheus metrics on /metrics: request latency per endpoint, time per stage
+# and per SQL statement, plus gauges read from the pool, caches and inference
+# queue at scrape time. The slow-request profiler is off unless switched on
+registry = Registry()
+profiler = SlowRequestProfiler(
+    interval=float(os.environ.get("PROFILER_INTERVAL_MS", 5)) / 1000,
+    threshold=float(os.environ.get("PROFILER_THRESHOLD_MS", 500)) / 1000,
+)
+timer = RequestTimer(registry, profiler)
+
+@app.before_request
+def start_request_timer():
+    timer.begin(request.endpoint)
+
+@app.after_request
+def finish_request_timer(response):
+    timings = timer.end(request.method, response.status_code, request.path)
+    if timings:
+        response.headers["Server-Timing"] = server_timing(timings)
+    return response
+
+def respond(body, status=200):
+    with timer.stage("serialize"):
+        response = jsonify(body)
+    return response, status
+
+# Uploads larger than this are rejected with 413 before they are read
+MAX_UPLOAD_BYTES = int(float(os.environ.get("MAX_UPLOAD_MB", 10)) * 1024 * 1024)
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+
 # DB connection info (hardcoded)
 db_config = {
     "host": "HOST",
@@ -20,72 +66,270 @@ db_config = {
     "database": "DB"
 }
 
+# Hot queries, prepared once per pooled connection
+STATEMENTS = {
+    "insert_product": "INSERT INTO products (name, description, category, is_boycotted) VALUES (%s, %s, %s, %s)",
+    "search_products": "SELECT product_id, name, is_boycotted FROM products WHERE name LIKE %s LIMIT 10",
+    "bump_catalog_version": "UPDATE catalog_version SET version = version + 1 WHERE id = 1",
+    "product_by_name": "SELECT product_id, name, is_boycotted FROM products WHERE name = %s",
+    "alternatives": """
+        SELECT p.name, s.cosine_score
+        FROM similarities s
+        JOIN products p ON s.alt_id = p.product_id
+        WHERE s.boycott_id = %s
+        ORDER BY s.cosine_score DESC
+        LIMIT 5
+    """,
+}
+
+# Top-5 alternatives for several boycotted products at once (batch lookups
+# while the catalog snapshot is not loaded)
+BATCH_ALTERNATIVES_SQL = """
+    SELECT boycott_id, name, cosine_score
+    FROM (
+        SELECT s.boycott_id, p.name, s.cosine_score,
+               ROW_NUMBER() OVER (PARTITION BY s.boycott_id ORDER BY s.cosine_score DESC) AS rn
+        FROM similarities s
+        JOIN products p ON s.alt_id = p.product_id
+        WHERE s.boycott_id IN ({placeholders})
+    ) ranked
+    WHERE rn <= 5
+    ORDER BY boycott_id, rn
+"""
+
+# Connection pool, sized against the number of request threads
+db_pool = ConnectionPool(
+    db_config,
+    size=int(os.environ.get("DB_POOL_SIZE", 8)),
+    timeout=float(os.environ.get("DB_POOL_TIMEOUT", 5)),
+    health_check_interval=float(os.environ.get("DB_POOL_HEALTH_CHECK_INTERVAL", 30)),
+    statements=STATEMENTS,
+    on_query=timer.query,
+)
+
 def get_db_connection():
     try:
-        print("Attempting DB connection...")
-        conn = mysql.connector.connect(**db_config)
-        print("DB connection successful")
-        return conn
+        return db_pool.get_connection()
     except Error as e:
         print(f"Error connecting to DB: {e}")
         raise
 
+def close_db(conn):
+    if conn is not None:
+        conn.close()
+
+# In-memory catalog snapshot for /process_image lookups, reloaded when
+# catalog_version changes (bumped by /add_product and scripts/match.py)
+catalog = CatalogCache(db_pool, poll_interval=float(os.environ.get("CATALOG_POLL_INTERVAL", 5)))
+
+# Autocomplete index, kept in sync with every catalog snapshot and updated
+# in place by /add_product
+search_index = SearchIndex()
+catalog.add_listener(search_index.sync)
+
+# Online alternatives for products added or flagged between match.py runs
+matcher = OnlineMatcher(
+    db_pool,
+    on_change=catalog.invalidate,
+    nprobe=int(os.environ.get("ANN_NPROBE", 8)),
+    candidates=int(os.environ.get("ANN_CANDIDATES", 100)),
+    max_alternatives=int(os.environ.get("ONLINE_MAX_ALTERNATIVES", 20)),
+)
+catalog.add_listener(lambda snapshot: matcher.refresh())
+
+def lookup_product(class_name):
+    """Return (product, alternatives) for a product name, or (None, [])."""
+    snapshot = catalog.get()
+    if snapshot is not None:
+        return snapshot.lookup(class_name)
+    conn = get_db_connection()
+    try:
+        rows = conn.execute("product_by_name", (class_name,)).fetchall()
+        product = rows[0] if rows else None
+        alternatives = []
+        if product and product['is_boycotted']:
+            alternatives = conn.execute("alternatives", (product['product_id'],)).fetchall()
+        return product, alternatives
+    finally:
+        conn.close()
+
+def lookup_products(names):
+    """{name: (product, alternatives)} for many names, from one snapshot pass or two queries."""
+    unique = list(dict.fromkeys(names))
+    snapshot = catalog.get()
+    if snapshot is not None:
+        return {name: snapshot.lookup(name) for name in unique}
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        with timer.sql("batch_products_by_name"):
+            cursor.execute(
+                f"SELECT product_id, name, is_boycotted FROM products WHERE name IN ({', '.join(['%s'] * len(unique))}) "
+                "ORDER BY product_id",
+                unique,
+            )
+            rows = cursor.fetchall()
+        products = {}
+        for row in rows:
+            products.setdefault(row['name'], row)
+        boycotted = [p['product_id'] for p in products.values() if p['is_boycotted']]
+        alternatives = {}
+        if boycotted:
+            with timer.sql("batch_alternatives"):
+                cursor.execute(BATCH_ALTERNATIVES_SQL.format(placeholders=", ".join(["%s"] * len(boycotted))), boycotted)
+                for r in cursor.fetchall():
+                    alternatives.setdefault(r['boycott_id'], []).append(
+                        {"name": r['name'], "cosine_score": r['cosine_score']}
+                    )
+    finally:
+        cursor.close()
+        conn.close()
+    return {
+        name: (products[name], alternatives.get(products[name]['product_id'], [])) if name in products else (None, [])
+        for name in unique
+    }
+
 
+# Serve UI from static/, read and compressed once at startup. Pages link
+# their assets by content hash, so browsers keep those until a deploy changes them
+static_assets = StaticAssets(app.static_folder)
 
-# Serve UI from static/
 @app.route('/')
 def serve_index():
-    return send_from_directory(app.static_folder, 'index.html')
+    return static_assets.response('index.html', request) or send_from_directory(app.static_folder, 'index.html')
 
 @app.route('/<path:path>')
 def serve_static(path):
-    return send_from_directory(app.static_folder, path)
+    return static_assets.response(path, request) or send_from_directory(app.static_folder, path)
 
 # API Endpoints
 @app.route('/add_product', methods=['POST', 'OPTIONS'])
 def add_product():
     if request.method == 'OPTIONS':
         return '', 200
+    conn = None
     try:
-        data = request.get_json(force=True)
+        with timer.stage("parse"):
+            data = request.get_json(force=True)
         name = data.get('name')
+        description = data.get('description')
+        category = data.get('category')
         is_boycotted = data.get('is_boycotted', False)
         if not name:
             return jsonify({"error": "Product 'name' is required"}), 400
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO products (name, is_boycotted) VALUES (%s, %s)",
-            (name, is_boycotted)
-        )
-        conn.commit()
-        return jsonify({"message": "Product added successfully"}), 201
+        product_id = conn.execute("insert_product", (name, description, category, is_boycotted)).lastrowid
+        conn.execute("bump_catalog_version")
+        with timer.sql("commit"):
+            conn.commit()
+        catalog.invalidate()
+        product = {"product_id": product_id, "name": name, "is_boycotted": int(bool(is_boycotted))}
+        search_index.add(product)
+        matcher.product_added(dict(product, description=description, category=category))
+        return respond({"message": "Product added successfully"}, 201)
+    except PoolTimeout as e:
+        return jsonify({"error": str(e)}), 503
+    except Error as e:
+        return jsonify({"error": str(e)}), 500
+    except Exception as e:
+        return jsonify({"error": f"Invalid request: {str(e)}"}), 400
+    finally:
+        close_db(conn)
+
+@app.route('/flag_boycott', methods=['POST', 'OPTIONS'])
+def flag_boycott():
+    if request.method == 'OPTIONS':
+        return '', 200
+    conn = None
+    cursor = None
+    in_transaction = False
+    try:
+        with timer.stage("parse"):
+            data = request.get_json(force=True)
+        if data.get('product_id') is None and not data.get('name'):
+            return jsonify({"error": "Product 'product_id' or 'name' is required"}), 400
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        with timer.sql("flag_select_product"):
+            if data.get('product_id') is not None:
+                cursor.execute(
+                    "SELECT product_id, name, description, category, is_boycotted FROM products WHERE product_id = %s",
+                    (data['product_id'],)
+                )
+            else:
+                cursor.execute(
+                    "SELECT product_id, name, description, category, is_boycotted FROM products WHERE name = %s ORDER BY product_id",
+                    (data['name'],)
+                )
+            rows = cursor.fetchall()
+        if not rows:
+            return jsonify({"error": "Product not found"}), 404
+        product = rows[0]
+        if product['is_boycotted']:
+            return jsonify({"message": "Product is already boycotted"}), 200
+
+        with timer.sql("flag_update"):
+            cursor.execute("START TRANSACTION")
+            in_transaction = True
+            cursor.execute("UPDATE products SET is_boycotted = TRUE WHERE product_id = %s", (product['product_id'],))
+            # A boycotted product can no longer be anyone's alternative
+            cursor.execute("DELETE FROM similarities WHERE alt_id = %s", (product['product_id'],))
+            cursor.execute("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+            conn.commit()
+            in_transaction = False
+        catalog.invalidate()
+        search_index.add({"product_id": product['product_id'], "name": product['name'], "is_boycotted": 1})
+        matcher.product_flagged(product)
+        return respond({"message": "Product flagged as boycotted"})
+    except PoolTimeout as e:
+        return jsonify({"error": str(e)}), 503
     except Error as e:
         return jsonify({"error": str(e)}), 500
     except Exception as e:
         return jsonify({"error": f"Invalid request: {str(e)}"}), 400
     finally:
-        try:
+        # Whichever handler ran, the flag update is not left half-applied
+        if in_transaction:
+            try:
+                conn.rollback()
+            except Error:
+                pass  # A broken connection is discarded on release
+        if cursor is not None:
             cursor.close()
-            conn.close()
-        except:
-            pass
+        close_db(conn)
+
+# Serialized and compressed /search_products responses per (catalog version,
+# normalized query); popular autocomplete prefixes skip the search and JSON encoding
+SEARCH_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_TTL", 30))
+search_cache = ResponseCache(
+    ttl=SEARCH_CACHE_TTL,
+    max_entries=int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", 10000)),
+)
 
 @app.route('/search_products', methods=['GET', 'OPTIONS'])
 def search_products():
     if request.method == 'OPTIONS':
         return '', 200
+    conn = None
     try:
-        query = request.args.get('query', '')
+        with timer.stage("parse"):
+            query = request.args.get('query', '')
         if not query:
             return jsonify({"products": []}), 200
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(
-            "SELECT product_id, name, is_boycotted FROM products WHERE name LIKE %s LIMIT 10",
-            (f"%{query}%",)
-        )
-        products = cursor.fetchall()
+        # Only results from a loaded snapshot's index are cached; None while it reloads
+        version = catalog_version() if search_index.ready else None
+        key = (version, normalize(query)) if version is not None else None
+        if key is not None:
+            with timer.stage("cache"):
+                cached = search_cache.get(key)
+            if cached is not None:
+                return send_payload(cached, request, f"public, max-age={int(SEARCH_CACHE_TTL)}")
+        if search_index.ready:
+            with timer.stage("search"):
+                products = search_index.search(query, limit=10)
+        else:
+            conn = get_db_connection()
+            products = conn.execute("search_products", (f"%{query}%",)).fetchall()
         results = [
             {
                 "product_id": p['product_id'],
@@ -93,82 +337,376 @@ def search_products():
                 "is_boycotted": p['is_boycotted']
             } for p in products
         ]
-        return jsonify({"products": results})
+        with timer.stage("serialize"):
+            payload = make_payload(app.json.dumps({"products": results}).encode(), "application/json")
+        if key is None:
+            return send_payload(payload, request, REVALIDATE)
+        search_cache.put(key, payload)
+        return send_payload(payload, request, f"public, max-age={int(SEARCH_CACHE_TTL)}")
+    except PoolTimeout as e:
+        return jsonify({"error": str(e)}), 503
     except Error as e:
         return jsonify({"error": f"Database query failed: {str(e)}"}), 500
     finally:
-        cursor.close()
-        conn.close()
+        close_db(conn)
+
+@app.route('/pool_stats', methods=['GET'])
+def pool_stats():
+    return jsonify(db_pool.stats())
 
-# Load YOLO model
-try:
-    model_path = os.path.join(os.getcwd(), 'models', 'best.pt')
-    model = YOLO(model_path)
-except Exception as e:
-    print(f"Error loading YOLO model: {e}")
-    exit(1)
+MODEL_PATH = os.path.join(os.getcwd(), 'models', 'best.pt')
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 0))
+
+if INFERENCE_WORKERS > 0:
+    # Production mode: a pool of inference processes forked from one loaded model.
+    # It doubles as the scheduler and the loader (readiness, class names)
+    scheduler = model_loader = InferencePool(
+        MODEL_PATH,
+        workers=INFERENCE_WORKERS,
+        threads_per_worker=int(os.environ.get("INFERENCE_THREADS_PER_WORKER", 1)),
+        warmup_size=int(os.environ.get("MODEL_INPUT_SIZE", 640)),
+        max_queue=int(os.environ.get("INFERENCE_MAX_QUEUE", 32)),
+    )
+else:
+    # Concurrent requests share batched forward passes in this process; the
+    # scheduler starts once the model has loaded
+    scheduler = BatchScheduler(
+        None,
+        max_batch_size=int(os.environ.get("INFERENCE_MAX_BATCH", 8)),
+        max_wait=float(os.environ.get("INFERENCE_MAX_WAIT_MS", 10)) / 1000,
+        max_queue=int(os.environ.get("INFERENCE_MAX_QUEUE", 32)),
+    )
+
+    def start_inference(model):
+        scheduler.model = model
+        scheduler.start()
+
+    # YOLO model, loaded and warmed up in the background; /process_image returns
+    # 503 until it is ready
+    model_loader = ModelLoader(
+        MODEL_PATH,
+        warmup_size=int(os.environ.get("MODEL_INPUT_SIZE", 640)),
+        on_ready=start_inference,
+    )
+INFERENCE_TIMEOUT = float(os.environ.get("INFERENCE_TIMEOUT", 30))
+
+# Uploads are decoded close to the model's input size
+preprocess = ImagePreprocessor(
+    target_size=int(os.environ.get("MODEL_INPUT_SIZE", 640)),
+    max_bytes=MAX_UPLOAD_BYTES,
+    max_pixels=int(os.environ.get("MAX_IMAGE_PIXELS", 50_000_000)),
+)
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({"error": f"Image exceeds the {MAX_UPLOAD_BYTES / (1024 * 1024):g} MB upload limit"}), 413
+
+# Near-duplicate photos are answered from recent results without inference
+result_cache = ResultCache(
+    max_distance=int(os.environ.get("RESULT_CACHE_MAX_DISTANCE", 4)),
+    max_entries=int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", 10000)),
+    max_bytes=int(float(os.environ.get("RESULT_CACHE_MAX_MB", 64)) * 1024 * 1024),
+    ttl=float(os.environ.get("RESULT_CACHE_TTL", 3600)),
+)
+
+NO_PRODUCT_RESPONSE = {"message": "No product detected", "status_message": "غير معروف"}
+
+def build_response(class_name, product, alternatives):
+    if product:
+        status_message = "هذا المنتج يخضع للمقاطعة" if product['is_boycotted'] else "هذا المنتج غير مخضوع للمقاطعة"
+        return {
+            "detected_product": class_name,
+            "is_boycotted": product['is_boycotted'],
+            "alternatives": alternatives
+        }
+    else:
+        return {
+            "detected_product": class_name,
+            "status_message": "المنتج غير موجود في قاعدة البيانات",
+            "alternatives": []
+        }
+
+def product_response(class_name):
+    return build_response(class_name, *lookup_product(class_name))
+
+def cached_response(image_hash, cached):
+    """Response for a result cache hit, rebuilt if the catalog changed since it was cached."""
+    if cached.class_name is None:
+        return cached.response
+    version = catalog_version()
+    if version is not None and cached.version == version:
+        return cached.response
+    # Same detection, but the catalog changed since it was cached
+    with timer.stage("lookup"):
+        response = product_response(cached.class_name)
+    result_cache.put(image_hash, cached.class_name, response, version)
+    return response
+
+def catalog_version():
+    # None while the snapshot is stale or not loaded; such results are never reused
+    snapshot = catalog.get()
+    return snapshot.version if snapshot is not None else None
 
 @app.route('/process_image', methods=['POST', 'OPTIONS'])
 def process_image():
     if request.method == 'OPTIONS':
         return '', 200
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        if 'image' in request.files:
+        with timer.stage("parse"):
+            has_image = 'image' in request.files
+        if has_image:
+            if not model_loader.ready:
+                message = "Image recognition is starting up, please retry shortly" \
+                    if model_loader.state == "loading" else "Image recognition is unavailable"
+                return jsonify({"error": message, "model": model_loader.state}), 503, {"Retry-After": "5"}
             file = request.files['image']
             try:
-                img = Image.open(io.BytesIO(file.read())).convert('RGB')
-                results = model(img)
+                with timer.stage("read"):
+                    data = preprocess.read(file.stream)
+                with timer.stage("decode"):
+                    img = preprocess.decode(data)
+                with timer.stage("resize"):
+                    img = preprocess.resize(img)
+                with timer.stage("cache"):
+                    image_hash = dhash(img)
+                    cached = result_cache.get(image_hash)
+                if cached is not None:
+                    return respond(cached_response(image_hash, cached))
+
+                with timer.stage("inference"):
+                    future = scheduler.submit(img)
+                    try:
+                        classes = future.result(timeout=INFERENCE_TIMEOUT)
+                    finally:
+                        # Frees its place in the queue if it is still waiting
+                        future.cancel()
+            except ImageTooLarge as e:
+                return jsonify({"error": str(e)}), 413
+            except InvalidImage as e:
+                return jsonify({"error": str(e)}), 400
+            except (QueueFull, WorkerCrashed) as e:
+                return jsonify({"error": str(e)}), 503
+            except (PoolTimeout, Error):
+                raise
             except Exception as e:
                 return jsonify({"error": f"Image processing failed: {str(e)}"}), 500
 
-            if not results[0].boxes:
-                return jsonify({"message": "No product detected", "status_message": "غير معروف"}), 200
+            if not classes:
+                result_cache.put(image_hash, None, NO_PRODUCT_RESPONSE, None)
+                return respond(NO_PRODUCT_RESPONSE)
 
-            pred = results[0].boxes.cls[0].item()
-            class_name = model.names[int(pred)]
+            class_name = model_loader.names[classes[0]]
         else:
-            data = request.get_json()
+            with timer.stage("parse"):
+                data = request.get_json()
             if not data or 'name' not in data:
                 return jsonify({"error": "Product name required for search"}), 400
             class_name = data['name']
+            image_hash = None
 
-        cursor.execute(
-            "SELECT product_id, name, is_boycotted FROM products WHERE name = %s",
-            (class_name,)
-        )
-        product = cursor.fetchone()
-        if product:
-            status_message = "هذا المنتج يخضع للمقاطعة" if product['is_boycotted'] else "هذا المنتج غير مخضوع للمقاطعة"
-            alternatives = []
-            if product['is_boycotted']:
-                cursor.execute("""
-                    SELECT p.name, s.cosine_score
-                    FROM similarities s
-                    JOIN products p ON s.alt_id = p.product_id
-                    WHERE s.boycott_id = %s
-                    ORDER BY s.cosine_score DESC
-                    LIMIT 5
-                """, (product['product_id'],))
-                alternatives = cursor.fetchall()
-            return jsonify({
-                "detected_product": class_name,
-                "is_boycotted": product['is_boycotted'],
-                "alternatives": alternatives
-            })
-        else:
-            return jsonify({
-                "detected_product": class_name,
-                "status_message": "المنتج غير موجود في قاعدة البيانات",
-                "alternatives": []
-            })
+        version = catalog_version()
+        with timer.stage("lookup"):
+            response = product_response(class_name)
+        if image_hash is not None:
+            result_cache.put(image_hash, class_name, response, version)
+        return respond(response)
+    except PoolTimeout as e:
+        return jsonify({"error": str(e)}), 503
     except Error as e:
         return jsonify({"error": f"Database query failed: {str(e)}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+
+# Batch endpoints for shopping lists and multi-product scans: one request,
+# one lookup pass, results in input order
+BATCH_MAX_NAMES = int(os.environ.get("BATCH_MAX_NAMES", 100))
+BATCH_MAX_IMAGES = int(os.environ.get("BATCH_MAX_IMAGES", 10))
+
+@app.route('/batch/lookup', methods=['POST', 'OPTIONS'])
+def batch_lookup():
+    if request.method == 'OPTIONS':
+        return '', 200
+    try:
+        with timer.stage("parse"):
+            data = request.get_json(force=True, silent=True)
+        names = data.get('names') if isinstance(data, dict) else None
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            return jsonify({"error": "'names' must be a list of product names"}), 400
+        if len(names) > BATCH_MAX_NAMES:
+            return jsonify({"error": f"At most {BATCH_MAX_NAMES} names per request"}), 400
+        with timer.stage("lookup"):
+            found = lookup_products(names) if names else {}
+        return respond({"results": [build_response(name, *found[name]) for name in names]})
+    except PoolTimeout as e:
+        return jsonify({"error": str(e)}), 503
+    except Error as e:
+        return jsonify({"error": f"Database query failed: {str(e)}"}), 500
+
+@app.route('/batch/process_image', methods=['POST', 'OPTIONS'])
+def batch_process_image():
+    if request.method == 'OPTIONS':
+        return '', 200
+    # MAX_UPLOAD_MB applies per image
+    request.max_content_length = MAX_UPLOAD_BYTES * BATCH_MAX_IMAGES
+    try:
+        with timer.stage("parse"):
+            files = request.files.getlist('images')
+        if not files:
+            return jsonify({"error": "Upload one or more images in the 'images' field"}), 400
+        if len(files) > BATCH_MAX_IMAGES:
+            return jsonify({"error": f"At most {BATCH_MAX_IMAGES} images per request"}), 400
+        if not model_loader.ready:
+            message = "Image recognition is starting up, please retry shortly" \
+                if model_loader.state == "loading" else "Image recognition is unavailable"
+            return jsonify({"error": message, "model": model_loader.state}), 503, {"Retry-After": "5"}
+
+        # A failed image gets an error entry; the others are still answered
+        results = [None] * len(files)
+        hashes = [None] * len(files)
+        images = {}
+        for i, file in enumerate(files):
+            try:
+                with timer.stage("read"):
+                    data = preprocess.read(file.stream)
+                with timer.stage("decode"):
+                    img = preprocess.decode(data)
+                with timer.stage("resize"):
+                    img = preprocess.resize(img)
+            except (ImageTooLarge, InvalidImage) as e:
+                results[i] = {"error": str(e)}
+                continue
+            with timer.stage("cache"):
+                hashes[i] = dhash(img)
+                cached = result_cache.get(hashes[i])
+            if cached is not None:
+                results[i] = cached_response(hashes[i], cached)
+            else:
+                images[i] = img
+
+        # Submitted back to back, the misses can share a forward pass
+        version = catalog_version()
+        detected = {}
+        with timer.stage("inference"):
+            futures = {}
+            for i, img in images.items():
+                try:
+                    futures[i] = scheduler.submit(img)
+                except (QueueFull, WorkerCrashed) as e:
+                    results[i] = {"error": str(e)}
+            deadline = time.monotonic() + INFERENCE_TIMEOUT
+            for i, future in futures.items():
+                try:
+                    classes = future.result(timeout=max(0, deadline - time.monotonic()))
+                except Exception as e:
+                    future.cancel()
+                    results[i] = {"error": f"Image processing failed: {str(e)}"}
+                    continue
+                if classes:
+                    detected[i] = model_loader.names[classes[0]]
+                else:
+                    results[i] = NO_PRODUCT_RESPONSE
+                    result_cache.put(hashes[i], None, NO_PRODUCT_RESPONSE, None)
+
+        if detected:
+            with timer.stage("lookup"):
+                found = lookup_products(list(detected.values()))
+            for i, class_name in detected.items():
+                results[i] = build_response(class_name, *found[class_name])
+                result_cache.put(hashes[i], class_name, results[i], version)
+        return respond({"results": results})
+    except PoolTimeout as e:
+        return jsonify({"error": str(e)}), 503
+    except Error as e:
+        return jsonify({"error": f"Database query failed: {str(e)}"}), 500
+
+@app.route('/result_cache_stats', methods=['GET'])
+def result_cache_stats():
+    return jsonify(result_cache.snapshot_stats())
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness: the process serves requests, whatever the state of the model
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # Readiness for image requests: model loaded and warmed up
+    body = {
+        "status": "ready" if model_loader.ready else model_loader.state,
+        "model": model_loader.status(),
+        "catalog_version": catalog.version,
+        "search_index_ready": search_index.ready,
+    }
+    return jsonify(body), 200 if model_loader.ready else 503
+
+# Scrape-time gauges and counters from the components' own stats
+registry.gauge("db_pool_connections", "Pooled database connections by state.",
+               lambda: {k: v for k, v in db_pool.stats().items() if k in ("in_use", "idle")}, label="state")
+registry.gauge("db_pool_size", "Maximum pooled database connections.", lambda: db_pool.size)
+registry.counter("db_pool_checkouts_total", "Connection checkouts.", lambda: db_pool.stats()["checkouts"])
+registry.counter("db_pool_waits_total", "Checkouts that waited for a free connection.", lambda: db_pool.stats()["waits"])
+registry.counter("db_pool_wait_seconds_total", "Time spent waiting for a free connection.",
+                 lambda: db_pool.stats()["wait_time_total"])
+registry.counter("db_pool_timeouts_total", "Checkouts that timed out.", lambda: db_pool.stats()["timeouts"])
+registry.gauge("result_cache_entries", "Cached /process_image results.", lambda: result_cache.snapshot_stats()["entries"])
+registry.gauge("result_cache_bytes", "Approximate size of the cached results.", lambda: result_cache.snapshot_stats()["bytes"])
+registry.counter("result_cache_lookups_total", "Result cache lookups by outcome.",
+                 lambda: {k: result_cache.stats[k] for k in ("hits", "near_hits", "misses", "expired")}, label="result")
+registry.counter("result_cache_evictions_total", "Results evicted from the cache.", lambda: result_cache.stats["evictions"])
+registry.gauge("inference_queue_depth", "Images waiting for inference.", lambda: scheduler.queue_depth())
+registry.counter("inference_images_total", "Images run through the model.", lambda: scheduler.stats["images"])
+registry.counter("inference_rejected_total", "Images rejected because the queue was full.", lambda: scheduler.stats["rejected"])
+registry.gauge("model_ready", "1 once the YOLO model is loaded and warmed up.", lambda: int(model_loader.ready))
+registry.gauge("catalog_version", "Catalog version of the in-memory snapshot.", lambda: catalog.version)
+registry.counter("catalog_loads_total", "Catalog snapshot loads by outcome.",
+                 lambda: {"ok": catalog.stats["loads"], "failed": catalog.stats["load_failures"]}, label="result")
+registry.gauge("search_cache_entries", "Cached /search_products responses.", lambda: len(search_cache))
+registry.counter("search_cache_lookups_total", "Search response cache lookups by outcome.",
+                 lambda: {k: search_cache.stats[k] for k in ("hits", "misses", "expired")}, label="result")
+registry.gauge("search_index_products", "Products in the autocomplete index.", lambda: len(search_index))
+registry.counter("online_matcher_products_total", "Products handled by the online matcher by outcome.",
+                 lambda: {k: matcher.stats[k] for k in ("matched", "indexed", "failures")}, label="result")
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return registry.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+# Slow-request profiler, switched at runtime with
+#   POST /debug/profiler {"enabled": true, "threshold_ms": 300}
+# and read with GET. Reports expose code paths, so both need the
+# X-Profiler-Token header to match PROFILER_TOKEN; without it the endpoint is off
+PROFILER_TOKEN = os.environ.get("PROFILER_TOKEN", "")
+
+@app.route('/debug/profiler', methods=['GET', 'POST'])
+def slow_request_profiler():
+    token = request.headers.get("X-Profiler-Token", "")
+    if not PROFILER_TOKEN or not hmac.compare_digest(token, PROFILER_TOKEN):
+        return jsonify({"error": "Forbidden"}), 403
+    if request.method == 'POST':
+        data = request.get_json(force=True, silent=True) or {}
+        profiler.configure(
+            enabled=data.get('enabled'),
+            threshold=data['threshold_ms'] / 1000 if data.get('threshold_ms') is not None else None,
+            interval=data['interval_ms'] / 1000 if data.get('interval_ms') is not None else None,
+        )
+        if data.get('clear'):
+            profiler.reports.clear()
+    return jsonify(dict(profiler.status(), slow_requests=list(profiler.reports)))
+
+if os.environ.get("PROFILER_ENABLED") == "1":
+    profiler.configure(enabled=True)
+
+def init_app():
+    """Start background work: catalog polling and model loading. Idempotent."""
+    if model_loader.state != "idle":
+        return
+    catalog.start(block=False)
+    model_loader.start()
+
+# Set APP_DEFER_INIT=1 to import the app without touching the database or the
+# model (tests, benchmarks); call init_app() later to start them. The spawned
+# inference zygote re-imports this module as __mp_main__ and must not start anything
+if os.environ.get("APP_DEFER_INIT") != "1" and __name__ != "__mp_main__":
+    init_app()
+logging.getLogger(__name__).debug("App imported in %.2fs", time.perf_counter() - _import_start)
 
 # Start the server
 if __name__ == '__main__':
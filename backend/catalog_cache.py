@@ -0,0 +1,154 @@
+import threading
+import time
+
+# Top-5 alternatives per boycotted product, same ordering as the per-request query
+TOP_ALTERNATIVES_SQL = """
+    SELECT boycott_id, name, cosine_score
+    FROM (
+        SELECT s.boycott_id, p.name, s.cosine_score,
+               ROW_NUMBER() OVER (PARTITION BY s.boycott_id ORDER BY s.cosine_score DESC) AS rn
+        FROM similarities s
+        JOIN products p ON s.alt_id = p.product_id
+    ) ranked
+    WHERE rn <= 5
+    ORDER BY boycott_id, rn
+"""
+
+
+class CatalogSnapshot:
+    """Immutable name -> product -> top-5 alternatives view of one catalog version."""
+
+    def __init__(self, version, products, alternatives):
+        self.version = version
+        self.products = products
+        self.products_by_name = {}
+        for p in products:
+            # products come ordered by product_id, keep the first row per name
+            self.products_by_name.setdefault(p['name'], p)
+        self.alternatives = alternatives
+
+    def lookup(self, name):
+        product = self.products_by_name.get(name)
+        if product is None:
+            return None, []
+        alternatives = self.alternatives.get(product['product_id'], []) if product['is_boycotted'] else []
+        return product, alternatives
+
+
+class CatalogCache:
+    def __init__(self, pool, poll_interval=5.0):
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self._snapshot = None
+        self._stale = True
+        self._generation = 0
+        self._reload_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._listeners = []
+        self._thread = None
+        self.stats = {"loads": 0, "load_failures": 0, "last_load_seconds": 0.0}
+
+    def add_listener(self, callback):
+        """callback(snapshot) runs after every new snapshot is swapped in."""
+        self._listeners.append(callback)
+
+    def get(self):
+        # A stale snapshot is never served; callers fall back to the database
+        if self._stale:
+            return None
+        return self._snapshot
+
+    @property
+    def version(self):
+        snapshot = self._snapshot
+        return snapshot.version if snapshot is not None else None
+
+    def invalidate(self):
+        self._generation += 1
+        self._stale = True
+        self._wakeup.set()
+
+    def _read_version(self, conn):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT version FROM catalog_version WHERE id = 1")
+            row = cursor.fetchone()
+            return row[0] if row else 0
+        finally:
+            cursor.close()
+
+    def _load(self, conn):
+        cursor = conn.cursor(dictionary=True)
+        try:
+            # All three reads come from the same consistent snapshot
+            cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+            cursor.execute("SELECT version FROM catalog_version WHERE id = 1")
+            row = cursor.fetchone()
+            version = row['version'] if row else 0
+            cursor.execute("SELECT product_id, name, is_boycotted FROM products ORDER BY product_id")
+            products = cursor.fetchall()
+            cursor.execute(TOP_ALTERNATIVES_SQL)
+            alternatives = {}
+            for r in cursor.fetchall():
+                alternatives.setdefault(r['boycott_id'], []).append(
+                    {"name": r['name'], "cosine_score": r['cosine_score']}
+                )
+            cursor.execute("COMMIT")
+        finally:
+            cursor.close()
+        return CatalogSnapshot(version, products, alternatives)
+
+    def refresh(self, force=False):
+        with self._reload_lock:
+            generation = self._generation
+            conn = self.pool.get_connection()
+            try:
+                if not force and not self._stale and self._snapshot is not None:
+                    if self._read_version(conn) == self._snapshot.version:
+                        return False
+                start = time.perf_counter()
+                snapshot = self._load(conn)
+            except Exception:
+                self.stats["load_failures"] += 1
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                raise
+            finally:
+                conn.close()
+            # Reference assignment is atomic; readers see either the old or new snapshot
+            self._snapshot = snapshot
+            # An invalidation that raced with this load keeps the cache stale
+            self._stale = self._generation != generation
+            self.stats["loads"] += 1
+            self.stats["last_load_seconds"] = time.perf_counter() - start
+        for callback in self._listeners:
+            callback(snapshot)
+        return True
+
+    def start(self, block=True):
+        """Load the first snapshot and start polling; with block=False the first load
+        also happens on the polling thread and callers fall back to the database meanwhile."""
+        if block:
+            self._initial_load()
+        self._thread = threading.Thread(target=self._run, args=(not block,), name="catalog-cache", daemon=True)
+        self._thread.start()
+
+    def _initial_load(self):
+        try:
+            self.refresh(force=True)
+            print(f"Catalog cache loaded (version {self.version})")
+        except Exception as e:
+            print(f"Error loading catalog cache: {e}")
+
+    def _run(self, initial_load=False):
+        if initial_load:
+            self._initial_load()
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing catalog cache: {e}")
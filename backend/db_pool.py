@@ -0,0 +1,196 @@
+import threading
+import time
+
+import mysql.connector
+from mysql.connector import Error, InterfaceError, OperationalError
+
+# Errors after which a connection is assumed dead (server restart, dropped socket)
+CONNECTION_ERRORS = (OperationalError, InterfaceError)
+
+
+class PoolTimeout(Error):
+    """Raised when no pooled connection becomes free within the checkout timeout."""
+
+
+class PooledConnection:
+    """Thin wrapper handed out by ConnectionPool; close() returns it to the pool."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._prepared = {}
+        self._broken = False
+        self.last_used = time.monotonic()
+
+    def cursor(self, *args, **kwargs):
+        return self._raw.cursor(*args, **kwargs)
+
+    def prepared(self, name):
+        # Server-side prepared statements live per connection, so the cursor
+        # (and the statement it prepared) is kept for the connection's lifetime.
+        cursor = self._prepared.get(name)
+        if cursor is None:
+            cursor = self._raw.cursor(prepared=True, dictionary=True)
+            self._prepared[name] = cursor
+        return cursor
+
+    def execute(self, name, params=()):
+        cursor = self.prepared(name)
+        start = time.perf_counter()
+        try:
+            cursor.execute(self._pool.statements[name], params)
+        except CONNECTION_ERRORS:
+            self._broken = True
+            raise
+        if self._pool.on_query is not None:
+            self._pool.on_query(name, time.perf_counter() - start)
+        return cursor
+
+    def commit(self):
+        try:
+            self._raw.commit()
+        except CONNECTION_ERRORS:
+            self._broken = True
+            raise
+
+    def rollback(self):
+        try:
+            self._raw.rollback()
+        except CONNECTION_ERRORS:
+            self._broken = True
+            raise
+
+    def close(self, error=False):
+        self._pool.release(self, error=error)
+
+    def _discard(self):
+        for cursor in self._prepared.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        self._prepared.clear()
+        try:
+            self._raw.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    def __init__(self, db_config, size=8, timeout=5.0, health_check_interval=30.0,
+                 statements=None, connect=None, on_query=None):
+        self.db_config = db_config
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.statements = dict(statements or {})
+        # Called with (statement name, seconds) after each prepared statement runs
+        self.on_query = on_query
+        self._connect = connect or mysql.connector.connect
+        self._idle = []
+        self._created = 0
+        self._lock = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+            "connections_opened": 0,
+            "connections_discarded": 0,
+            "rollbacks_on_release": 0,
+        }
+
+    def _open(self):
+        raw = self._connect(**self.db_config)
+        raw.autocommit = True  # each checkout sees fresh data, no stale snapshot
+        self._stats["connections_opened"] += 1
+        return PooledConnection(self, raw)
+
+    def _healthy(self, conn):
+        if time.monotonic() - conn.last_used < self.health_check_interval:
+            return True
+        try:
+            conn._raw.ping(reconnect=False)
+            return True
+        except Exception:
+            self._stats["health_check_failures"] += 1
+            return False
+
+    def get_connection(self):
+        start = time.monotonic()
+        waited = False
+        with self._lock:
+            while not self._idle and self._created >= self.size:
+                waited = True
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(msg=f"No database connection available within {self.timeout}s")
+                self._lock.wait(remaining)
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._created += 1
+            self._stats["checkouts"] += 1
+            if waited:
+                wait_time = time.monotonic() - start
+                self._stats["waits"] += 1
+                self._stats["wait_time_total"] += wait_time
+                self._stats["wait_time_max"] = max(self._stats["wait_time_max"], wait_time)
+
+        # Connecting and pinging happen outside the lock so a slow server
+        # does not block other checkouts.
+        try:
+            if conn is not None and not self._healthy(conn):
+                conn._discard()
+                conn = None
+            if conn is None:
+                conn = self._open()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+                self._lock.notify()
+            raise
+        return conn
+
+    def release(self, conn, error=False):
+        """Return conn to the pool, or close it if it failed or lost its server.
+
+        Only clean connections are re-pooled: a transaction left open by the
+        caller is rolled back first. Otherwise a dead connection would be handed
+        out again and again, because the idle-time health check never runs while
+        traffic keeps it busy.
+        """
+        broken = error or conn._broken
+        if not broken:
+            try:
+                if not conn._raw.is_connected():
+                    broken = True
+                elif conn._raw.in_transaction:
+                    conn._raw.rollback()
+                    self._stats["rollbacks_on_release"] += 1
+            except Exception:
+                broken = True
+        if broken:
+            conn._discard()
+            with self._lock:
+                self._created -= 1
+                self._stats["connections_discarded"] += 1
+                self._lock.notify()
+            return
+        conn.last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(conn)
+            self._lock.notify()
+
+    def stats(self):
+        with self._lock:
+            idle = len(self._idle)
+            return dict(
+                self._stats,
+                size=self.size,
+                created=self._created,
+                idle=idle,
+                in_use=self._created - idle,
+            )
@@ -0,0 +1,178 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # optional; without it only gzip variants are built
+    brotli = None
+
+# Compressing small or already-compressed bodies (images) costs more than it saves
+MIN_COMPRESS_BYTES = 512
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+# Versioned asset URLs change whenever the file does, so they can be cached for good
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Cached, but revalidated with ETag / Last-Modified on every use
+REVALIDATE = "no-cache"
+
+# Relative asset references in HTML, e.g. href="styles.css" or src="script.js"
+_ASSET_REF = re.compile(rb'(\b(?:href|src)=")([^"#?:]+)(")')
+
+# A response body with its precompressed variants ({coding: bytes}) and validators
+Payload = namedtuple("Payload", ["body", "variants", "etag", "mimetype", "last_modified"])
+
+
+def compress(data, mimetype):
+    """{content coding: body} for data, keeping only codings that make it smaller."""
+    if len(data) < MIN_COMPRESS_BYTES or not mimetype.startswith(COMPRESSIBLE_TYPES):
+        return {}
+    variants = {}
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data):
+        variants["gzip"] = gz
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data):
+            variants["br"] = br
+    return variants
+
+
+def make_payload(data, mimetype, last_modified=None):
+    return Payload(data, compress(data, mimetype), hashlib.sha256(data).hexdigest()[:16], mimetype, last_modified)
+
+
+def choose_encoding(accept_encodings, variants):
+    """Best precompressed coding the client accepts (br over gzip), or None for the plain body."""
+    for coding in ("br", "gzip"):
+        if coding in variants and accept_encodings.quality(coding) > 0:
+            return coding
+    return None
+
+
+def send_payload(payload, request, cache_control):
+    """Response for payload in the coding the client accepts; 304 when its validators still match."""
+    coding = choose_encoding(request.accept_encodings, payload.variants)
+    response = Response(payload.variants[coding] if coding else payload.body, mimetype=payload.mimetype)
+    if payload.variants:
+        response.vary.add("Accept-Encoding")
+    if coding:
+        response.content_encoding = coding
+    # Each coding is a different representation, so it gets its own ETag
+    response.set_etag(f"{payload.etag}-{coding}" if coding else payload.etag)
+    if payload.last_modified is not None:
+        response.last_modified = payload.last_modified
+    response.headers["Cache-Control"] = cache_control
+    return response.make_conditional(request)
+
+
+class StaticAssets:
+    """static/ read once at startup with content-hash ETags and precompressed variants.
+
+    HTML pages have their local CSS/JS/image links rewritten to name?v=<hash>.
+    A request carrying the current hash is served as immutable. Pages and
+    unversioned URLs are revalidated and answered 304 while unchanged. Files
+    added after startup are not known here; callers fall back to sending them
+    from disk.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.assets = {}
+        self.load()
+
+    def load(self):
+        files = {}
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                rel = os.path.relpath(path, self.root).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    files[rel] = (f.read(), os.path.getmtime(path))
+        hashes = {rel: hashlib.sha256(data).hexdigest()[:16] for rel, (data, _) in files.items()}
+
+        assets = {}
+        for rel, (data, mtime) in files.items():
+            mimetype = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+            if mimetype == "text/html":
+                data, mtime = self._version_links(rel, data, mtime, files, hashes)
+            assets[rel] = make_payload(data, mimetype, mtime)
+        self.assets = assets
+
+    @staticmethod
+    def _version_links(rel, data, mtime, files, hashes):
+        """Page with ?v=<hash> appended to links to other (non-HTML) assets, and its effective mtime."""
+        linked = [mtime]
+
+        def version(match):
+            target = posixpath.normpath(posixpath.join(posixpath.dirname(rel), match.group(2).decode()))
+            if target not in hashes or target.endswith((".html", ".htm")):
+                return match.group(0)
+            linked.append(files[target][1])
+            return match.group(1) + match.group(2) + f"?v={hashes[target]}".encode() + match.group(3)
+
+        data = _ASSET_REF.sub(version, data)
+        # The page changes when an asset it links to does
+        return data, max(linked)
+
+    def response(self, path, request):
+        """Response for a static path, or None when the file was not there at startup."""
+        payload = self.assets.get(path)
+        if payload is None:
+            return None
+        cache_control = IMMUTABLE if request.args.get("v") == payload.etag else REVALIDATE
+        if payload.mimetype == "text/html":
+            cache_control = REVALIDATE
+        return send_payload(payload, request, cache_control)
+
+
+class ResponseCache:
+    """Short-TTL cache of serialized responses, LRU-bounded by entry count.
+
+    Callers put the catalog version in the key, so a catalog change makes
+    older entries unreachable; they age out through the TTL and LRU order.
+    """
+
+    def __init__(self, ttl=30, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (payload, expires), LRU first
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            payload, expires = entry
+            if expires <= now:
+                del self._entries[key]
+                self.stats["expired"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return payload
+
+    def put(self, key, payload):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (payload, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
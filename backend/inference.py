@@ -0,0 +1,86 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class QueueFull(Exception):
+    """Raised when the inference queue is at capacity; the request should be retried later."""
+
+
+def detected_classes(result):
+    """Class ids of a YOLO result's boxes, most confident first."""
+    if not result.boxes:
+        return []
+    return [int(c) for c in result.boxes.cls.tolist()]
+
+
+class BatchScheduler:
+    """Collects images from concurrent requests and runs them through the model in batches.
+
+    Only images with the same size and mode share a forward pass: YOLO letterboxes a
+    batch of identical shapes exactly like a single image, so every request gets the
+    same result it would get from model(img) on its own. Futures resolve to the
+    detected class ids.
+    """
+
+    def __init__(self, model, max_batch_size=8, max_wait=0.01, max_queue=32):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self.stats = {"batches": 0, "images": 0, "rejected": 0, "largest_batch": 0}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, img):
+        future = Future()
+        try:
+            self._queue.put_nowait((img, future))
+        except queue.Full:
+            self.stats["rejected"] += 1
+            raise QueueFull(f"Inference queue is full ({self._queue.maxsize} images waiting), please retry shortly")
+        return future
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            groups = {}
+            for img, future in batch:
+                groups.setdefault((img.size, img.mode), []).append((img, future))
+            for items in groups.values():
+                items = [(img, f) for img, f in items if f.set_running_or_notify_cancel()]
+                if not items:
+                    continue
+                images = [img for img, _ in items]
+                futures = [f for _, f in items]
+                try:
+                    results = self.model(images)
+                except Exception as e:
+                    for f in futures:
+                        f.set_exception(e)
+                    continue
+                for f, result in zip(futures, results):
+                    f.set_result(detected_classes(result))
+                self.stats["batches"] += 1
+                self.stats["images"] += len(images)
+                self.stats["largest_batch"] = max(self.stats["largest_batch"], len(images))
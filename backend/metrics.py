@@ -0,0 +1,272 @@
+import collections
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers a cached lookup (sub-millisecond) up to a cold CPU inference
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, rendered in the Prometheus text format."""
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, list(v)) for k, v in self._series.items())
+        for label_values, values in series:
+            cumulative = 0
+            for bound, n in zip(self.buckets, values):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels(self.labels, label_values, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labels, label_values, [('le', '+Inf')])} {values[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {values[-2]!r}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {values[-1]}")
+        return lines
+
+
+class Collected:
+    """Gauge or counter read from a callback at scrape time.
+
+    The callback returns a number, or {label value: number} when the metric has
+    a label; a callback that raises is skipped so one broken source cannot
+    break the whole scrape.
+    """
+
+    def __init__(self, name, help, fn, kind="gauge", label=None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.kind = kind
+        self.label = label
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            value = self.fn()
+            if self.label is None:
+                lines.append(f"{self.name} {_number(value)}")
+            else:
+                for key, v in sorted(value.items()):
+                    lines.append(f"{self.name}{_labels([self.label], [key])} {_number(v)}")
+        except Exception:
+            return []
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help, fn, label=None):
+        self._metrics.append(Collected(name, help, fn, "gauge", label))
+
+    def counter(self, name, help, fn, label=None):
+        self._metrics.append(Collected(name, help, fn, "counter", label))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class RequestTimer:
+    """Per-request stage timings on top of the registry's histograms.
+
+    begin()/end() bracket a request on the thread that serves it; stage(name)
+    times a block of that request into request_stage_seconds and the request's
+    Server-Timing breakdown. Stages outside a request (background threads) only
+    feed the histogram under endpoint "background".
+    """
+
+    def __init__(self, registry, profiler=None):
+        self.requests = registry.histogram(
+            "http_request_duration_seconds", "Request latency by endpoint, method and status.",
+            ("endpoint", "method", "status"))
+        self.stages = registry.histogram(
+            "request_stage_seconds", "Time spent per stage of a request.", ("endpoint", "stage"))
+        self.queries = registry.histogram(
+            "db_query_seconds", "SQL statement latency by query name.", ("query",))
+        self.profiler = profiler
+        self._local = threading.local()
+
+    def begin(self, endpoint):
+        self._local.endpoint = endpoint or "unknown"
+        self._local.start = time.perf_counter()
+        self._local.timings = {}
+        if self.profiler is not None:
+            self.profiler.begin()
+
+    def end(self, method, status, path=None):
+        """Record the request and return its {stage: milliseconds}."""
+        start = getattr(self._local, "start", None)
+        if start is None:
+            return {}
+        duration = time.perf_counter() - start
+        endpoint, timings = self._local.endpoint, self._local.timings
+        self._local.start = None
+        self.requests.observe(duration, endpoint, method, str(status))
+        if self.profiler is not None:
+            self.profiler.end(duration, {"endpoint": endpoint, "method": method, "path": path,
+                                         "status": status, "stages_ms": timings})
+        return timings
+
+    def record(self, stage, seconds):
+        endpoint = getattr(self._local, "endpoint", None) if getattr(self._local, "start", None) else None
+        self.stages.observe(seconds, endpoint or "background", stage)
+        if endpoint is not None:
+            timings = self._local.timings
+            timings[stage] = timings.get(stage, 0.0) + seconds * 1000
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def query(self, name, seconds):
+        """Observer for named SQL statements; each also counts toward the request's "db" stage."""
+        self.queries.observe(seconds, name)
+        self.record("db", seconds)
+
+    @contextmanager
+    def sql(self, name):
+        """Time ad-hoc statements (and commits) that do not go through a prepared statement."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.query(name, time.perf_counter() - start)
+
+
+def server_timing(timings):
+    """Format {stage: milliseconds} as a Server-Timing header value."""
+    return ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in timings.items())
+
+
+class SlowRequestProfiler:
+    """Statistical profiler for slow requests, switched on and off at runtime.
+
+    While enabled, a background thread samples the stacks of threads that are
+    serving a request (sys._current_frames) every `interval` seconds. When a
+    request finishes its samples are dropped, unless it took longer than
+    `threshold` seconds; then its hottest stacks are kept in a bounded list of
+    reports. Disabled, the cost is one attribute check per request.
+    """
+
+    def __init__(self, interval=0.005, threshold=0.5, max_reports=50, max_depth=40, top_stacks=20):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_depth = max_depth
+        self.top_stacks = top_stacks
+        self.enabled = False
+        self.reports = collections.deque(maxlen=max_reports)
+        self._active = {}  # thread id -> Counter of folded stacks
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {"samples": 0, "captured": 0}
+
+    def configure(self, enabled=None, threshold=None, interval=None):
+        if threshold is not None:
+            self.threshold = float(threshold)
+        if interval is not None:
+            self.interval = max(0.001, float(interval))
+        if enabled is not None:
+            self.enabled = bool(enabled)
+            if not self.enabled:
+                with self._lock:
+                    self._active.clear()
+            elif self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+                self._thread.start()
+
+    def begin(self):
+        if self.enabled:
+            with self._lock:
+                self._active[threading.get_ident()] = collections.Counter()
+
+    def end(self, duration, info):
+        if not self._active:
+            return
+        with self._lock:
+            stacks = self._active.pop(threading.get_ident(), None)
+        if stacks is None or duration < self.threshold:
+            return
+        self.stats["captured"] += 1
+        self.reports.append(dict(
+            info,
+            duration_ms=round(duration * 1000, 1),
+            finished_at=time.time(),
+            samples=sum(stacks.values()),
+            stacks=[{"stack": stack, "count": n} for stack, n in stacks.most_common(self.top_stacks)],
+        ))
+
+    def _fold(self, frame):
+        """Root-first 'file:function:line;...' string for a frame's stack."""
+        parts = []
+        while frame is not None and len(parts) < self.max_depth:
+            code = frame.f_code
+            parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        return ";".join(reversed(parts))
+
+    def _run(self):
+        while self.enabled:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for ident, stacks in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[self._fold(frame)] += 1
+                        self.stats["samples"] += 1
+                del frames
+
+    def status(self):
+        return {"enabled": self.enabled, "threshold_ms": self.threshold * 1000,
+                "interval_ms": self.interval * 1000, **self.stats, "reports": len(self.reports)}
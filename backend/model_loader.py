@@ -0,0 +1,68 @@
+import threading
+import time
+
+
+class ModelLoader:
+    """Loads the YOLO model on a background thread so the app can serve other routes meanwhile.
+
+    The model only counts as ready after a warm-up inference, which pays for
+    lazy initialisation (layer fusing, allocator warm-up) before real requests do.
+    """
+
+    def __init__(self, path, warmup_size=640, on_ready=None):
+        self.path = path
+        self.warmup_size = warmup_size
+        self.on_ready = on_ready
+        self.model = None
+        self.state = "idle"  # idle -> loading -> ready | failed
+        self.error = None
+        self.timings = {}
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    @property
+    def names(self):
+        return self.model.names if self.model is not None else {}
+
+    def start(self):
+        self.state = "loading"
+        self._thread = threading.Thread(target=self._load, name="model-loader", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def _load(self):
+        try:
+            start = time.perf_counter()
+            # torch and ultralytics are only imported here, off the startup path
+            from ultralytics import YOLO
+            from PIL import Image
+            self.timings["import_seconds"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            model = YOLO(self.path)
+            self.timings["load_seconds"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            model([Image.new('RGB', (self.warmup_size, self.warmup_size))], verbose=False)
+            self.timings["warmup_seconds"] = time.perf_counter() - start
+
+            self.model = model
+            if self.on_ready is not None:
+                self.on_ready(model)
+            self.state = "ready"
+            print("YOLO model ready: " + ", ".join(f"{k} {v:.2f}s" for k, v in self.timings.items()))
+        except Exception as e:
+            self.error = str(e)
+            self.state = "failed"
+            print(f"Error loading YOLO model: {e}")
+
+    def status(self):
+        return {"state": self.state, "path": self.path, "error": self.error,
+                **{k: round(v, 3) for k, v in self.timings.items()}}
@@ -0,0 +1,164 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ann_index import AlternativeIndex
+from clustering import ClusterModel, assign
+from embedding_store import (EmbeddingSnapshot, MODEL_NAME, content_hash, current_version,
+                             decode_blobs, encode_blob, product_text)
+from keywords import keyword_bits, keyword_matrix, load_vocabulary, pack_rows, tokenize
+
+
+def normalize_category(category):
+    # Same standardization as match.py
+    return category.strip().lower() if category else ""
+
+
+class OnlineMatcher:
+    """Computes alternatives for single products as they are added or flagged.
+
+    All index work runs on one background thread, so requests only enqueue it.
+    """
+
+    def __init__(self, pool, on_change=None, nprobe=8, candidates=100, max_alternatives=20):
+        self.pool = pool
+        self.on_change = on_change
+        self.nprobe = nprobe
+        self.candidates = candidates
+        self.max_alternatives = max_alternatives
+        self.index = None
+        self.clusters = None
+        self._encoder = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="online-matcher")
+        self.stats = {"matched": 0, "indexed": 0, "failures": 0, "last_match_ms": 0.0}
+
+    def refresh(self):
+        """Rebuild the index in the background if a newer embedding snapshot was published."""
+        return self._executor.submit(self._guard, self._rebuild)
+
+    def product_added(self, product):
+        return self._executor.submit(self._guard, self._handle, product)
+
+    def product_flagged(self, product):
+        return self._executor.submit(self._guard, self._handle, dict(product, is_boycotted=1))
+
+    def _guard(self, fn, *args):
+        try:
+            return fn(*args)
+        except Exception as e:
+            self.stats["failures"] += 1
+            print(f"Online matcher error: {e}")
+
+    def _rebuild(self):
+        version = current_version()
+        if version is None or (self.index is not None and self.index.version == version):
+            return
+        snapshot = EmbeddingSnapshot.open(version=version)
+        vocabulary = load_vocabulary()
+        if snapshot is None or vocabulary is None:
+            print("Online matcher disabled until embed.py and match.py have run.")
+            return
+        keywords, term_index = vocabulary
+        # Centroids saved by embed.py, for cluster rows of new products
+        self.clusters = ClusterModel.load()
+
+        start = time.perf_counter()
+        conn = self.pool.get_connection()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT product_id, description, category, is_boycotted FROM products ORDER BY product_id")
+            products = cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+        positions = snapshot.positions([p['product_id'] for p in products])
+        products = [dict(p, category=normalize_category(p['category'])) for p, pos in zip(products, positions) if pos >= 0]
+        positions = positions[positions >= 0]
+        bits = pack_rows(keyword_matrix((tokenize(p['description'], p['category']) for p in products),
+                                        term_index, len(keywords)))
+        self.index = AlternativeIndex.build(
+            products, snapshot.rows(positions), bits, keywords, term_index,
+            version=version, nprobe=self.nprobe, candidates=self.candidates,
+        )
+        print(f"Online matcher index built from snapshot v{version}: {len(self.index)} candidates "
+              f"in {time.perf_counter() - start:.2f}s")
+
+    def _embedding(self, conn, product):
+        """Stored embedding when its hash is current, otherwise encode and store it."""
+        text = product_text(product)
+        h = content_hash(text)
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT embedding FROM product_embeddings WHERE content_hash = %s LIMIT 1", (h,))
+            row = cursor.fetchone()
+            if row is not None:
+                embedding = decode_blobs([row[0]])[0]
+            else:
+                if self._encoder is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._encoder = SentenceTransformer(MODEL_NAME, trust_remote_code=True)
+                embedding = self._encoder.encode([text], convert_to_tensor=False)[0]
+            # embed.py sees the matching hash and will not encode this product again
+            cursor.execute("""
+                INSERT INTO product_embeddings (product_id, embedding, content_hash)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE embedding = VALUES(embedding), content_hash = VALUES(content_hash)
+            """, (product['product_id'], encode_blob(embedding), h))
+        finally:
+            cursor.close()
+        return embedding
+
+    def _assign_cluster(self, conn, product_id, embedding):
+        """Store the nearest saved centroid so match.py's cluster join sees the product before embed.py reruns."""
+        model = self.clusters
+        if model is None or model.model_name != MODEL_NAME or model.centroids.shape[1] != len(embedding):
+            return
+        labels, _ = assign(model.centroids, embedding[None, :])
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                INSERT INTO product_clusters (product_id, cluster_id)
+                VALUES (%s, %s)
+                ON DUPLICATE KEY UPDATE cluster_id = VALUES(cluster_id)
+            """, (product_id, int(labels[0])))
+        finally:
+            cursor.close()
+
+    def _handle(self, product):
+        index = self.index
+        if index is None:
+            return
+        start = time.perf_counter()
+        category = normalize_category(product.get('category'))
+        conn = self.pool.get_connection()
+        try:
+            embedding = self._embedding(conn, product)
+            self._assign_cluster(conn, product['product_id'], embedding)
+            bits = keyword_bits(tokenize(product.get('description'), category), index.term_index, len(index.keywords))
+            if not product['is_boycotted']:
+                index.add(category, product['product_id'], embedding, bits)
+                self.stats["indexed"] += 1
+                return
+
+            index.remove(category, product['product_id'])
+            alternatives = index.alternatives(category, embedding, bits)[:self.max_alternatives]
+            cursor = conn.cursor()
+            try:
+                # The alternatives and the version bump become visible together
+                cursor.execute("START TRANSACTION")
+                cursor.executemany("""
+                    INSERT INTO similarities (boycott_id, alt_id, cosine_score)
+                    VALUES (%s, %s, %s)
+                """, [(product['product_id'], alt_id, combined) for alt_id, combined, _, _ in alternatives])
+                cursor.execute("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+        self.stats["matched"] += 1
+        self.stats["last_match_ms"] = (time.perf_counter() - start) * 1000
+        if self.on_change is not None:
+            self.on_change()
@@ -0,0 +1,73 @@
+import io
+
+READ_CHUNK = 64 * 1024
+
+
+class ImageTooLarge(Exception):
+    """Raised when an upload exceeds the byte or pixel limit (HTTP 413)."""
+
+
+class InvalidImage(Exception):
+    """Raised when an upload cannot be decoded as an image (HTTP 400)."""
+
+
+class ImagePreprocessor:
+    """Bounded upload read, reduced-size decode and EXIF orientation ahead of the model.
+
+    The model letterboxes every input to target_size on its longest side, so
+    decoding a 12 MP photo at full resolution only to shrink it again is wasted
+    work. JPEGs are decoded at the smallest DCT scale that still covers
+    target_size and everything is then resized to exactly that size.
+    """
+
+    def __init__(self, target_size=640, max_bytes=10 * 1024 * 1024, max_pixels=50_000_000):
+        self.target_size = target_size
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+
+    def read(self, stream):
+        """Read an upload stream into memory, failing as soon as it exceeds max_bytes."""
+        buf = io.BytesIO()
+        while True:
+            chunk = stream.read(READ_CHUNK)
+            if not chunk:
+                break
+            if buf.tell() + len(chunk) > self.max_bytes:
+                raise ImageTooLarge(f"Image exceeds the {self.max_bytes / (1024 * 1024):g} MB upload limit")
+            buf.write(chunk)
+        buf.seek(0)
+        return buf
+
+    def decode(self, data):
+        """Decode to an RGB image no larger than target_size on its longest side."""
+        # PIL is imported on first use to keep it off the app's startup path
+        from PIL import Image, ImageOps, UnidentifiedImageError
+        try:
+            img = Image.open(data)
+        except UnidentifiedImageError:
+            raise InvalidImage("Uploaded file is not a supported image")
+        except Image.DecompressionBombError as e:
+            # PIL's own limit (2x Image.MAX_IMAGE_PIXELS) trips before ours can
+            raise ImageTooLarge(str(e))
+        width, height = img.size
+        # Checked from the header, before any pixel data is decoded
+        if width * height > self.max_pixels:
+            raise ImageTooLarge(f"Image has {width * height} pixels, the limit is {self.max_pixels}")
+        try:
+            # JPEG only: decode at 1/2, 1/4 or 1/8 scale, never below the requested size
+            img.draft('RGB', (self.target_size, self.target_size))
+            img = ImageOps.exif_transpose(img)
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+        except Image.DecompressionBombError as e:
+            raise ImageTooLarge(str(e))
+        except (OSError, SyntaxError) as e:
+            raise InvalidImage(f"Uploaded image could not be decoded: {e}")
+        return img
+
+    def resize(self, img):
+        from PIL import Image
+        if max(img.size) > self.target_size:
+            # Same interpolation as the model's letterbox resize
+            img.thumbnail((self.target_size, self.target_size), Image.Resampling.BILINEAR)
+        return img
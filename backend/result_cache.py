@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+HASH_BITS = 64
+ENTRY_OVERHEAD = 256  # rough per-entry bookkeeping cost in bytes, on top of the response size
+
+CachedResult = namedtuple("CachedResult", ["class_name", "response", "version", "distance"])
+
+
+def dhash(img, size=8):
+    """64-bit difference hash: sign of horizontal gradients on a (size+1) x size grayscale thumbnail."""
+    from PIL import Image
+    small = np.asarray(img.convert('L').resize((size + 1, size), Image.Resampling.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class ResultCache:
+    """Near-duplicate image -> detection result cache keyed by dHash.
+
+    Lookups tolerate up to max_distance differing bits. The hash is split into
+    max_distance + 1 bands, and any hash within that distance matches at least
+    one band exactly (pigeonhole). Each band is indexed in a dict, so a lookup
+    only compares against entries sharing a band instead of scanning the cache.
+    """
+
+    def __init__(self, max_distance=4, max_entries=10000, max_bytes=64 * 1024 * 1024, ttl=3600):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        n_bands = min(max_distance + 1, HASH_BITS)
+        edges = np.linspace(0, HASH_BITS, n_bands + 1).astype(int)
+        # (shift, mask) per band
+        self._bands = [(int(lo), (1 << int(hi - lo)) - 1) for lo, hi in zip(edges[:-1], edges[1:])]
+        self._band_index = [{} for _ in self._bands]
+        self._entries = OrderedDict()  # hash -> (class_name, response, version, expires, size), LRU first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "near_hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def _band_keys(self, h):
+        return [(h >> shift) & mask for shift, mask in self._bands]
+
+    def _remove(self, h):
+        class_name, response, version, expires, size = self._entries.pop(h)
+        self._bytes -= size
+        for index, key in zip(self._band_index, self._band_keys(h)):
+            bucket = index[key]
+            bucket.discard(h)
+            if not bucket:
+                del index[key]
+
+    def get(self, h):
+        """Closest cached result within max_distance of hash h, or None."""
+        now = time.monotonic()
+        with self._lock:
+            best, best_distance = None, None
+            if h in self._entries:
+                best, best_distance = h, 0
+            else:
+                seen = set()
+                for index, key in zip(self._band_index, self._band_keys(h)):
+                    for candidate in index.get(key, ()):
+                        if candidate in seen:
+                            continue
+                        seen.add(candidate)
+                        distance = (candidate ^ h).bit_count()
+                        if distance <= self.max_distance and (best is None or distance < best_distance):
+                            best, best_distance = candidate, distance
+            if best is None:
+                self.stats["misses"] += 1
+                return None
+            class_name, response, version, expires, size = self._entries[best]
+            if expires <= now:
+                self._remove(best)
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(best)
+            self.stats["hits"] += 1
+            if best_distance:
+                self.stats["near_hits"] += 1
+            return CachedResult(class_name, response, version, best_distance)
+
+    def put(self, h, class_name, response, version):
+        size = len(json.dumps(response, ensure_ascii=False, default=str)) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if h in self._entries:
+                self._remove(h)
+            self._entries[h] = (class_name, response, version, time.monotonic() + self.ttl, size)
+            self._bytes += size
+            for index, key in zip(self._band_index, self._band_keys(h)):
+                index.setdefault(key, set()).add(h)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def snapshot_stats(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return dict(self.stats, entries=len(self._entries), bytes=self._bytes,
+                        hit_rate=self.stats["hits"] / lookups if lookups else 0.0)
@@ -0,0 +1,173 @@
+import bisect
+import re
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+
+# Arabic letter variants folded to one form, Arabic-Indic digits to ASCII
+_FOLD = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+    'ـ': None,  # tatweel
+    **{chr(0x0660 + d): str(d) for d in range(10)},
+    **{chr(0x06F0 + d): str(d) for d in range(10)},
+})
+_NON_WORD = re.compile(r'[\W_]+', re.UNICODE)
+
+PREFIX_CAP = 64           # ids kept per trie node, shortest names first
+FUZZY_MAX_POSTING = 2000  # very common n-grams carry little signal and cost the most
+FUZZY_MIN_SCORE = 0.5     # share of query n-grams a fuzzy match must contain
+
+
+def normalize(text):
+    """Case-fold, strip Latin accents and Arabic diacritics, fold letter variants."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = text.translate(_FOLD).casefold()
+    return _NON_WORD.sub(' ', text).strip()
+
+
+def ngrams(tokens, n=3):
+    grams = set()
+    for tok in tokens:
+        padded = f" {tok} "
+        for i in range(len(padded) - n + 1):
+            grams.add(padded[i:i + n])
+    return grams
+
+
+class _TrieNode:
+    __slots__ = ('children', 'ids')
+
+    def __init__(self):
+        self.children = {}
+        self.ids = []  # (name length, product_id), sorted and capped
+
+
+class SearchIndex:
+    """In-memory product name index: word-prefix trie plus character trigram postings."""
+
+    def __init__(self):
+        self._docs = {}       # product_id -> (product, normalized name, tokens)
+        self._postings = {}   # trigram -> array of product ids
+        self._root = _TrieNode()
+        self._lock = threading.Lock()
+        self.ready = False
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, product):
+        pid = product['product_id']
+        norm = normalize(product['name'])
+        with self._lock:
+            existing = self._docs.get(pid)
+            self._docs[pid] = (product, norm, norm.split())
+            # Same name: only the stored product (e.g. boycott flag) changes.
+            # Renamed products leave stale postings behind; queries re-verify
+            # every candidate against the current name so they never match.
+            if existing is not None and existing[1] == norm:
+                return
+            tokens = norm.split()
+            for gram in ngrams(tokens):
+                self._postings.setdefault(gram, array('l')).append(pid)
+            key = (len(norm), pid)
+            for tok in set(tokens):
+                node = self._root
+                for ch in tok:
+                    node = node.children.setdefault(ch, _TrieNode())
+                    if len(node.ids) < PREFIX_CAP or key < node.ids[-1]:
+                        bisect.insort(node.ids, key)
+                        del node.ids[PREFIX_CAP:]
+
+    def sync(self, snapshot):
+        """Index products from a catalog snapshot that are new or changed, and drop deleted ones."""
+        current = {p['product_id'] for p in snapshot.products}
+        with self._lock:
+            # Their postings and trie entries stay behind; queries skip ids without a doc
+            for pid in [pid for pid in self._docs if pid not in current]:
+                del self._docs[pid]
+        for p in snapshot.products:
+            doc = self._docs.get(p['product_id'])
+            if doc is None or doc[0] != p:
+                self.add(p)
+        self.ready = True
+
+    def _prefix_ids(self, token):
+        node = self._root
+        for ch in token:
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        return [pid for _, pid in node.ids]
+
+    def search(self, query, limit=10):
+        qnorm = normalize(query)
+        qtokens = qnorm.split()
+        if not qtokens:
+            return []
+        ranked = {}  # product_id -> sort key
+
+        def consider(pid, tier, score=0.0):
+            doc = self._docs.get(pid)
+            if doc is None:
+                return
+            key = (tier, -score, len(doc[1]), pid)
+            if pid not in ranked or key < ranked[pid]:
+                ranked[pid] = key
+
+        # 1. Every query token is a prefix of some word in the name
+        candidates = None
+        for tok in sorted(qtokens, key=len, reverse=True):
+            ids = set(self._prefix_ids(tok))
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                break
+        for pid in candidates or ():
+            doc = self._docs.get(pid)
+            if doc and all(any(w.startswith(t) for w in doc[2]) for t in qtokens):
+                norm = doc[1]
+                tier = 0 if norm == qnorm else 1 if norm.startswith(qnorm) else 2
+                consider(pid, tier)
+
+        # 2. Plain substring match, what LIKE '%q%' used to return
+        if len(ranked) < limit and len(qnorm) >= 3:
+            grams = [qnorm[i:i + 3] for i in range(len(qnorm) - 2)]
+            postings = [self._postings.get(g) for g in grams if ' ' not in g]
+            if postings and all(postings):
+                for pid in min(postings, key=len):
+                    if pid in ranked:
+                        continue
+                    doc = self._docs.get(pid)
+                    if doc and qnorm in doc[1]:
+                        consider(pid, 3)
+                        if len(ranked) >= limit:
+                            break
+
+        # 3. Typo tolerance: names sharing most of the query's trigrams
+        if len(ranked) < limit and len(qnorm) >= 3:
+            qgrams = ngrams(qtokens)
+            counts = Counter()
+            for g in qgrams:
+                posting = self._postings.get(g)
+                if posting is not None and len(posting) <= FUZZY_MAX_POSTING:
+                    counts.update(posting)
+            # Stale postings of renamed products only add to a count, so it is an
+            # upper bound of the overlap; the overlap is recomputed from the current name
+            verified = 0
+            for pid, common in counts.most_common():
+                if common / len(qgrams) < FUZZY_MIN_SCORE or verified >= limit * 2:
+                    break
+                doc = self._docs.get(pid)
+                if pid in ranked or doc is None:
+                    continue
+                score = len(qgrams & ngrams(doc[2])) / len(qgrams)
+                if score >= FUZZY_MIN_SCORE:
+                    consider(pid, 4, score)
+                    verified += 1
+
+        best = sorted(ranked.items(), key=lambda item: item[1])[:limit]
+        # A concurrent sync() may have dropped a product since it was ranked
+        docs = [self._docs.get(pid) for pid, _ in best]
+        return [doc[0] for doc in docs if doc is not None]
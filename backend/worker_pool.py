@@ -0,0 +1,339 @@
+import gc
+import itertools
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import reduction
+from multiprocessing.connection import Connection
+
+import numpy as np
+
+from inference import QueueFull, detected_classes
+
+
+class WorkerCrashed(Exception):
+    """Raised for a request whose inference worker died while processing it."""
+
+
+def _load_model(model_path, warmup_size):
+    import torch
+    from PIL import Image
+    from ultralytics import YOLO
+    # One thread while loading: OpenMP pools started before fork() are not
+    # usable in the children
+    torch.set_num_threads(1)
+    model = YOLO(model_path)
+    # The warm-up also fuses layers, so every worker inherits the fused model
+    model([Image.new('RGB', (warmup_size, warmup_size))], verbose=False)
+    return model
+
+
+def _worker_main(model, threads, requests, events):
+    import torch
+    from PIL import Image
+    torch.set_num_threads(threads)
+    pid = os.getpid()
+    zygote = os.getppid()
+    while True:
+        # The request pipe is this worker's alone, so there is no shared read
+        # lock a crash could leave held
+        try:
+            if not requests.poll(1):
+                # Orphaned when the zygote dies; the front end starts a new pool
+                if os.getppid() != zygote:
+                    return
+                continue
+            item = requests.recv()
+        except (EOFError, OSError):
+            return  # The front end closed its end
+        if item is None:
+            return
+        request_id, array = item
+        try:
+            result = model([Image.fromarray(array)], verbose=False)[0]
+            events.put(("done", pid, request_id, detected_classes(result), None))
+        except Exception as e:
+            events.put(("done", pid, request_id, None, str(e)))
+
+
+def _zygote_main(model_path, warmup_size, n_workers, threads, control, events):
+    """Loads the model once, then forks the workers and re-forks any that die.
+
+    Every worker gets a fresh request pipe; its write end is handed to the
+    front end over `control` before the event announcing the worker.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        start = time.perf_counter()
+        model = _load_model(model_path, warmup_size)
+        load_seconds = time.perf_counter() - start
+    except Exception as e:
+        events.put(("failed", str(e)))
+        return
+    # Move everything allocated so far out of the collector's reach, so GC passes
+    # in the workers do not write to (and un-share) the inherited pages
+    gc.collect()
+    gc.freeze()
+
+    def fork_worker():
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                os.close(write_fd)
+                control.close()
+                _worker_main(model, threads, Connection(read_fd, writable=False), events)
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+        # Only the worker holds the read end, so writes fail once it is gone
+        os.close(read_fd)
+        reduction.send_handle(control, write_fd, None)
+        os.close(write_fd)
+        return pid
+
+    workers = [fork_worker() for _ in range(n_workers)]
+    events.put(("ready", dict(model.names), load_seconds, workers))
+    workers = set(workers)
+    while workers:
+        pid, status = os.wait()
+        if pid not in workers:
+            continue
+        workers.discard(pid)
+        if os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0:
+            continue  # clean shutdown
+        new_pid = fork_worker()
+        workers.add(new_pid)
+        events.put(("died", pid, status, new_pid))
+
+
+class _WorkerSlot:
+    """Front-end side of one worker: its request pipe and the requests sent to it.
+
+    A sender thread drains a local queue into the pipe, so submit() never
+    blocks on a busy worker.
+    """
+
+    def __init__(self, pid, conn, pending, lock):
+        self.pid = pid
+        self.conn = conn
+        # Request ids given to this worker that it has not answered, including
+        # cancelled ones it is already working on
+        self.assigned = set()
+        self._outbox = queue.SimpleQueue()
+        self._pending = pending
+        self._lock = lock
+        threading.Thread(target=self._send, name=f"inference-send-{pid}", daemon=True).start()
+
+    def put(self, request_id, array):
+        self.assigned.add(request_id)
+        self._outbox.put((request_id, array))
+
+    def _send(self):
+        while True:
+            item = self._outbox.get()
+            if item is None:
+                break
+            with self._lock:
+                if item[0] not in self._pending:
+                    # Cancelled or timed out while waiting here
+                    self.assigned.discard(item[0])
+                    continue
+            try:
+                self.conn.send(item)
+            except OSError:
+                break  # Worker died; its "died" event fails what it was assigned
+        self.conn.close()
+
+    def close(self):
+        self._outbox.put(None)
+
+
+class InferencePool:
+    """Multi-process inference: a zygote loads the model and forks worker processes.
+
+    Workers share the loaded weights copy-on-write and run single images with
+    their own torch thread count, so throughput scales with processes instead of
+    serializing behind one interpreter's GIL. Same submit()/readiness interface
+    as BatchScheduler and ModelLoader.
+
+    Each worker reads requests from its own pipe, and the front end tracks
+    which requests it sent to which worker. A worker that dies fails exactly
+    those requests, and its replacement starts on a new pipe. Workers and the
+    zygote report back on one SimpleQueue.
+    """
+
+    def __init__(self, model_path, workers=None, threads_per_worker=1, warmup_size=640, max_queue=32):
+        self.model_path = model_path
+        self.threads_per_worker = threads_per_worker
+        self.n_workers = workers or max(1, (os.cpu_count() or 1) // threads_per_worker)
+        self.warmup_size = warmup_size
+        self.max_queue = max_queue
+        self.names = {}
+        self.state = "idle"  # idle -> loading -> ready | failed
+        self.error = None
+        self.timings = {}
+        self.stats = {"images": 0, "rejected": 0, "failures": 0, "crashes": 0, "restarts": 0}
+        self._ctx = multiprocessing.get_context("spawn")
+        self._ids = itertools.count()
+        self._generation = 0
+        self._pending = {}  # request id -> Future
+        self._slots = {}    # worker pid -> _WorkerSlot
+        self._lock = threading.Lock()
+        self._events = None
+        self._control = None
+        self._zygote = None
+        self._workers = []
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def start(self):
+        self.state = "loading"
+        self._events = self._ctx.SimpleQueue()
+        self._spawn()
+        threading.Thread(target=self._collect, name="inference-pool", daemon=True).start()
+
+    def _spawn(self):
+        self._started = time.perf_counter()
+        self._generation += 1
+        # Carries the workers' request pipes from the zygote; a fresh one per
+        # zygote so nothing from a dead one is read by mistake
+        self._control, zygote_control = self._ctx.Pipe()
+        self._zygote = self._ctx.Process(
+            target=_zygote_main,
+            args=(self.model_path, self.warmup_size, self.n_workers, self.threads_per_worker,
+                  zygote_control, self._events),
+            name="inference-zygote",
+            daemon=True,
+        )
+        self._zygote.start()
+        zygote_control.close()
+        threading.Thread(target=self._watch, args=(self._zygote, self._generation),
+                         name="inference-zygote-watch", daemon=True).start()
+
+    def _watch(self, zygote, generation):
+        zygote.join()
+        self._events.put(("exited", generation, zygote.exitcode))
+
+    def submit(self, img):
+        future = Future()
+        with self._lock:
+            if len(self._pending) >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise QueueFull(f"Inference queue is full ({self.max_queue} images waiting), please retry shortly")
+            if not self._slots:
+                raise WorkerCrashed("Inference workers are restarting, please retry")
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            # Least-loaded worker
+            min(self._slots.values(), key=lambda s: len(s.assigned)).put(request_id, np.asarray(img))
+        # A caller that cancels (e.g. after timing out) frees its place in the queue
+        future.add_done_callback(lambda f: self._release(request_id))
+        return future
+
+    def queue_depth(self):
+        return len(self._pending)
+
+    def _release(self, request_id):
+        """Forget a request; returns its future if it was still pending."""
+        with self._lock:
+            return self._pending.pop(request_id, None)
+
+    def _finish(self, request_id, classes=None, error=None):
+        future = self._release(request_id)
+        if future is None:
+            return
+        if error is not None:
+            self.stats["failures"] += 1
+            future.set_exception(error)
+        else:
+            self.stats["images"] += 1
+            future.set_result(classes)
+
+    def _add_worker(self, pid):
+        try:
+            fd = reduction.recv_handle(self._control)
+        except (EOFError, OSError):
+            return  # The zygote died; its "exited" event restarts the pool
+        with self._lock:
+            self._slots[pid] = _WorkerSlot(pid, Connection(fd, readable=False), self._pending, self._lock)
+
+    def _fail_all(self, error):
+        with self._lock:
+            # Cleared in place: the slots' sender threads check this dict
+            pending = dict(self._pending)
+            self._pending.clear()
+            slots, self._slots = self._slots, {}
+        for slot in slots.values():
+            slot.close()
+        for future in pending.values():
+            future.set_exception(error)
+
+    def _collect(self):
+        while True:
+            message = self._events.get()
+            kind = message[0]
+            if kind == "done":
+                _, pid, request_id, classes, error = message
+                with self._lock:
+                    slot = self._slots.get(pid)
+                    if slot is not None:
+                        slot.assigned.discard(request_id)
+                self._finish(request_id, classes, RuntimeError(error) if error else None)
+            elif kind == "died":
+                _, pid, status, new_pid = message
+                self.stats["crashes"] += 1
+                self._workers = [p for p in self._workers if p != pid] + [new_pid]
+                print(f"Inference worker {pid} died (status {status}), restarted as {new_pid}")
+                with self._lock:
+                    slot = self._slots.pop(pid, None)
+                    lost = list(slot.assigned) if slot is not None else []
+                if slot is not None:
+                    slot.close()
+                # Queued for it or in progress: none of these will be answered
+                for request_id in lost:
+                    self._finish(request_id, error=WorkerCrashed("Inference worker crashed while processing the image"))
+                self._add_worker(new_pid)
+            elif kind == "ready":
+                _, self.names, load_seconds, workers = message
+                for pid in workers:
+                    self._add_worker(pid)
+                self._workers = sorted(workers)
+                self.timings = {"load_seconds": load_seconds, "ready_seconds": time.perf_counter() - self._started}
+                self.state = "ready"
+                print(f"Inference pool ready: {len(self._workers)} workers x {self.threads_per_worker} threads, "
+                      f"model loaded in {load_seconds:.2f}s")
+            elif kind == "failed":
+                self.error = message[1]
+                self.state = "failed"
+                print(f"Error loading YOLO model in inference pool: {self.error}")
+            elif kind == "exited":
+                _, generation, exitcode = message
+                if generation != self._generation or self.state == "failed":
+                    continue
+                if self.state == "loading":
+                    self.error = f"Inference zygote exited with code {exitcode} while loading"
+                    self.state = "failed"
+                    print(self.error)
+                    continue
+                # The zygote died after startup: start over with a fresh one
+                print(f"Inference zygote exited with code {exitcode}, restarting")
+                self.stats["restarts"] += 1
+                self.state = "loading"
+                self._workers = []
+                self._fail_all(WorkerCrashed("Inference workers restarted, please retry"))
+                self._control.close()
+                self._spawn()
+
+    def status(self):
+        return {"state": self.state, "path": self.model_path, "error": self.error,
+                "workers": list(self._workers), "threads_per_worker": self.threads_per_worker,
+                **{k: round(v, 3) for k, v in self.timings.items()}, **self.stats}
@@ -0,0 +1,266 @@
+"""Latency percentiles and throughput of the HTTP API under concurrent load.
+
+Usage: python benchmarks/bench_api.py --size 10000 --concurrency 1,8,32 --duration 10
+
+Builds a synthetic catalog in SQLite (setup.py ingestion, then embed.py and
+match.py with the stub encoder), starts backend/app.py on a local port with the
+stub detector, and drives /search_products, /process_image and /add_product
+from client threads. The detector sleeps --inference-ms per batch, so
+/process_image numbers measure everything around the model.
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+
+from common import latency_summary, write_results
+
+ENDPOINTS = ["search", "process_image", "add_product"]
+
+
+def prepare(workdir, size, seed):
+    """Catalog CSV -> SQLite database with embeddings, similarities and keyword files."""
+    import catalog
+    import sqlite_shim
+    import stubs
+    stubs.install_encoder()
+    stubs.install_wordnet()
+    import embed
+    import match
+    import setup
+
+    db_path = os.path.join(workdir, "catalog.db")
+    csv_path = catalog.write_catalog(os.path.join(workdir, "products.csv"), size, seed)
+    sqlite_shim.create_schema(db_path)
+    conn = sqlite_shim.connect(db_path)
+    setup.ingest(conn, conn.cursor(), csv_path, "append")
+    conn.commit()
+    conn.close()
+
+    embed.get_db_connection = match.get_db_connection = lambda: sqlite_shim.connect(db_path)
+    embed.main([])
+    match.main([])
+    return db_path, csv_path
+
+
+def search_queries(names, n, rng):
+    """Prefixes of product names plus some with a typo, like the search box sends."""
+    queries = []
+    for name in rng.choices(names, k=n):
+        query = name[:rng.randint(3, max(3, min(len(name), 14)))]
+        if rng.random() < 0.2 and len(query) > 4:
+            i = rng.randrange(1, len(query) - 1)
+            query = query[:i] + query[i + 1] + query[i] + query[i + 2:]
+        queries.append(query)
+    return queries
+
+
+def jpeg_images(count, n_classes, seed):
+    import stubs
+    rng = random.Random(seed)
+    images = []
+    for i in range(count):
+        buf = io.BytesIO()
+        # Some images show nothing the detector knows
+        class_id = rng.randrange(n_classes) if rng.random() < 0.9 else -1
+        stubs.make_image(class_id, seed * 100003 + i).save(buf, format="JPEG", quality=85)
+        images.append(buf.getvalue())
+    return images
+
+
+def multipart(field, filename, payload):
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: image/jpeg\r\n\r\n").encode() + payload + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def make_request(endpoint, i, data):
+    """(method, path, body, headers) for the i-th request to an endpoint."""
+    if endpoint == "search":
+        query = data["queries"][i % len(data["queries"])]
+        return "GET", "/search_products?" + urllib.parse.urlencode({"query": query}), None, {}
+    if endpoint == "process_image":
+        body, content_type = multipart("image", "photo.jpg", data["images"][i % len(data["images"])])
+        return "POST", "/process_image", body, {"Content-Type": content_type}
+    category = data["categories"][i % len(data["categories"])]
+    body = json.dumps({
+        "name": f"Bench product {uuid.uuid4().hex[:12]}",
+        "description": f"benchmark {category} product",
+        "category": category,
+        "is_boycotted": i % 2 == 0,
+    }).encode()
+    return "POST", "/add_product", body, {"Content-Type": "application/json"}
+
+
+def parse_server_timing(header):
+    timings = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if params.startswith("dur="):
+            timings[name] = float(params[4:])
+    return timings
+
+
+def run_load(port, endpoint, concurrency, duration, data):
+    """Closed-loop load: each client thread sends its next request as soon as the last one returns."""
+    latencies, server_timings = [], {}
+    errors = [0]
+    statuses = {}
+    lock = threading.Lock()
+    counter = iter(range(10 ** 9))
+    deadline = time.perf_counter() + duration
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        local, local_timings = [], {}
+        while time.perf_counter() < deadline:
+            with lock:
+                i = next(counter)
+            method, path, body, headers = make_request(endpoint, i, data)
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+                timing = parse_server_timing(response.getheader("Server-Timing"))
+                if response.getheader("Connection", "").lower() == "close" or response.version == 10:
+                    conn.close()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                status, timing = "connection_error", {}
+            elapsed = time.perf_counter() - start
+            with lock:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if status in (200, 201):
+                local.append(elapsed)
+                for name, ms in timing.items():
+                    local_timings.setdefault(name, []).append(ms)
+            else:
+                with lock:
+                    errors[0] += 1
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            for name, values in local_timings.items():
+                server_timings.setdefault(name, []).extend(values)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    summary = latency_summary(latencies, errors[0], time.perf_counter() - start)
+    summary["statuses"] = statuses
+    if server_timings:
+        summary["server_timing_mean_ms"] = {
+            name: round(sum(values) / len(values), 3) for name, values in sorted(server_timings.items())
+        }
+    return summary
+
+
+def get_json(port, path):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        conn.request("GET", path)
+        return json.loads(conn.getresponse().read())
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=10000, help="synthetic catalog size")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated client thread counts")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per endpoint and concurrency level")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help=f"subset of {','.join(ENDPOINTS)}")
+    parser.add_argument("--detector-classes", type=int, default=200,
+                        help="the stub detector's classes are the first N product names")
+    parser.add_argument("--inference-ms", type=float, default=30.0, help="stub detector time per batch")
+    parser.add_argument("--per-image-ms", type=float, default=5.0, help="stub detector time per image in a batch")
+    parser.add_argument("--images", type=int, default=50,
+                        help="distinct test images; requests cycle through them, so repeats hit the result cache")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="result file (default benchmarks/results/...; '-' prints)")
+    args = parser.parse_args()
+    endpoints = args.endpoints.split(",")
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    workdir = tempfile.mkdtemp(prefix="bench-api-")
+    # Module-level paths in the backend and scripts are read at import time
+    os.environ.update(
+        EMBEDDING_STORE_DIR=os.path.join(workdir, "embeddings"),
+        KEYWORD_VOCAB_PATH=os.path.join(workdir, "keyword_vocab.json"),
+        SYNONYM_CACHE_PATH=os.path.join(workdir, "synonym_cache.json"),
+        MATCH_CHECKPOINT_DIR=os.path.join(workdir, "match_checkpoint"),
+        APP_DEFER_INIT="1",
+    )
+    try:
+        print(f"Preparing a {args.size}-product catalog in {workdir}...", file=sys.stderr)
+        db_path, csv_path = prepare(workdir, args.size, args.seed)
+
+        import pandas as pd
+        import sqlite_shim
+        import stubs
+        products = pd.read_csv(csv_path, dtype=str, encoding="utf-8-sig")
+        names = products["product_name"].tolist()
+        stubs.install_detector(dict(enumerate(names[:args.detector_classes])), args.inference_ms, args.per_image_ms)
+
+        import app as app_module
+        from werkzeug.serving import make_server
+        app_module.db_pool._connect = lambda **config: sqlite_shim.connect(db_path)
+        app_module.init_app()
+        app_module.model_loader.wait()
+        while not app_module.search_index.ready:
+            time.sleep(0.05)
+        app_module.matcher.refresh().result()
+
+        server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_port
+
+        rng = random.Random(args.seed)
+        data = {
+            "queries": search_queries(names, 5000, rng),
+            "images": jpeg_images(args.images, min(args.detector_classes, len(names)), args.seed)
+            if "process_image" in endpoints else [],
+            "categories": sorted(products["category"].dropna().unique()),
+        }
+
+        results = {}
+        for endpoint in endpoints:
+            results[endpoint] = {}
+            for concurrency in levels:
+                summary = run_load(port, endpoint, concurrency, args.duration, data)
+                results[endpoint][str(concurrency)] = summary
+                print(f"{endpoint:>14} x{concurrency:<3} p50 {summary.get('p50_ms', 0):8.2f} ms  "
+                      f"p99 {summary.get('p99_ms', 0):8.2f} ms  {summary.get('throughput_rps', 0):8.1f} req/s  "
+                      f"errors {summary['errors']}", file=sys.stderr)
+        results["server"] = {
+            "pool_stats": get_json(port, "/pool_stats"),
+            "result_cache_stats": get_json(port, "/result_cache_stats"),
+            "online_matcher": dict(app_module.matcher.stats),
+        }
+        server.shutdown()
+
+        config = dict(vars(args), db="sqlite")
+        config.pop("output")
+        write_results("api", config, results, args.output)
+
+    finally:
+        # Background threads of the app may still hold files here
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
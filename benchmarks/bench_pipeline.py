@@ -0,0 +1,183 @@
+"""Stage timings of the offline pipeline (setup.py ingestion, embed.py, match.py) on synthetic catalogs.
+
+Usage: python benchmarks/bench_pipeline.py --sizes 1000,10000,100000 [--db sqlite|mysql] [--encoder stub|real]
+
+Each size runs in its own process with its own database, embedding store and
+keyword files, so module-level paths and peak RSS are per size. With --db mysql
+the BENCH_MYSQL_HOST/USER/PASSWORD/DATABASE environment variables name a
+scratch database whose tables are dropped and recreated.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from common import StageTimer, write_results
+
+PRODUCTS_QUERY = "SELECT product_id, name, description, category FROM products ORDER BY product_id"
+
+
+def connect(db, workdir):
+    if db == "sqlite":
+        import sqlite_shim
+        path = os.path.join(workdir, "catalog.db")
+        sqlite_shim.create_schema(path)
+        return sqlite_shim.connect(path)
+    import mysql.connector
+    return mysql.connector.connect(
+        host=os.environ.get("BENCH_MYSQL_HOST", "localhost"),
+        user=os.environ.get("BENCH_MYSQL_USER", "root"),
+        password=os.environ.get("BENCH_MYSQL_PASSWORD", ""),
+        database=os.environ.get("BENCH_MYSQL_DATABASE", "recsys_bench"),
+    )
+
+
+def run_one(size, db, encoder, workdir, match_workers):
+    """Runs in a child process; module paths were pointed at workdir through the environment."""
+    import catalog
+    import stubs
+    if encoder == "stub":
+        stubs.install_encoder()
+    wordnet = stubs.install_wordnet()
+
+    import embed
+    import match
+    import setup
+    from embedding_store import EmbeddingSnapshot
+
+    timer = StageTimer()
+    csv_path = os.path.join(workdir, "products.csv")
+    with timer("generate_catalog"):
+        catalog.write_catalog(csv_path, size)
+
+    conn = connect(db, workdir)
+    cursor = conn.cursor(dictionary=True)
+    if db == "mysql":
+        setup.recreate_tables(conn, cursor)
+
+    with timer("setup.ingest"):
+        setup.ingest(conn, conn.cursor(), csv_path, "append")
+        conn.commit()
+
+    # embed.py, stage by stage as in embed.main()
+    read_conn = connect(db, workdir)
+    encoder = embed.Encoder()
+    with timer("embed.ensure_schema"):
+        embed.ensure_schema(cursor)
+    with timer("embed.prune_deleted"):
+        embed.prune_deleted(cursor)
+        conn.commit()
+    products = 0
+    with timer("embed.encode_stream"):
+        for chunk in embed.stream_rows(read_conn, PRODUCTS_QUERY):
+            embed.encode_changed(cursor, chunk, encoder)
+            conn.commit()
+            products += len(chunk)
+    with timer("embed.write_snapshot"):
+        snapshot = EmbeddingSnapshot.open(version=embed.write_embedding_snapshot(read_conn))
+    n_categories = embed.category_count(cursor)
+    with timer("embed.cluster_fit"):
+        embed.update_clusters(cursor, snapshot.ids, snapshot.embeddings, n_categories)
+        conn.commit()
+    # With saved centroids, a rerun only assigns products to the nearest one
+    with timer("embed.cluster_assign"):
+        embed.update_clusters(cursor, snapshot.ids, snapshot.embeddings, n_categories)
+        conn.commit()
+    # A second run over an unchanged catalog only compares hashes
+    with timer("embed.unchanged_rerun"):
+        for chunk in embed.stream_rows(read_conn, PRODUCTS_QUERY):
+            embed.encode_changed(cursor, chunk, encoder)
+    read_conn.close()
+
+    # match.py, stage by stage as in match.main()
+    with timer("match.load_records"):
+        records, embeddings = match.load_records(cursor)
+    with timer("match.build_keyword_vectors"):
+        keyword_matrix, keywords = match.build_keyword_vectors(records)
+    with timer("match.run_shards"):
+        shards = match.plan_shards(records)
+        checkpoint = match.Checkpoint(os.path.join(workdir, "match_checkpoint"),
+                                      match.run_key(records, embeddings, keyword_matrix, keywords))
+        match.run_shards(shards, records, embeddings, keyword_matrix, checkpoint, match_workers)
+    loader = match.SimilarityLoader(conn)
+    boycotted = with_alternatives = 0
+    with timer("match.stage"):
+        loader.create_staging()
+        for shard_id, _, _ in shards:
+            summary = checkpoint.manifest["shards"][str(shard_id)]
+            rows = checkpoint.load(shard_id)
+            boycotted += summary["boycotted"]
+            with_alternatives += len(np.unique(rows['boycott_id']))
+            loader.add(list(zip(rows['boycott_id'].tolist(), rows['alt_id'].tolist(), rows['combined'].tolist())))
+    with timer("match.publish"):
+        loader.publish()
+        cursor.execute("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+        conn.commit()
+    loader.close()
+    cursor.close()
+    conn.close()
+
+    stages = dict(timer.stages)
+    stages["pipeline_total"] = round(sum(v for k, v in stages.items() if k != "generate_catalog"), 4)
+    return {
+        "products": products,
+        "boycotted": boycotted,
+        "boycotted_with_alternatives": with_alternatives,
+        "similarities": loader.rows_written,
+        "keywords": len(keywords),
+        "embedding_dim": int(embeddings.shape[1]),
+        "wordnet": wordnet,
+        "encoded_texts_per_second": round(encoder.rate, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages_seconds": stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000", help="comma-separated catalog sizes")
+    parser.add_argument("--db", choices=["sqlite", "mysql"], default="sqlite")
+    parser.add_argument("--encoder", choices=["stub", "real"], default="stub",
+                        help="stub: hashed bag-of-words vectors; real: the sentence-transformers model")
+    parser.add_argument("--match-workers", type=int, default=os.cpu_count() or 1,
+                        help="match.py shard worker processes (default: CPU count)")
+    parser.add_argument("--output", help="result file (default benchmarks/results/...; '-' prints)")
+    parser.add_argument("--run-one", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        print(json.dumps(run_one(args.run_one, args.db, args.encoder, args.workdir, args.match_workers)))
+        return
+
+    results = {}
+    for size in (int(s) for s in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory(prefix=f"bench-pipeline-{size}-") as workdir:
+            env = dict(os.environ,
+                       EMBEDDING_STORE_DIR=os.path.join(workdir, "embeddings"),
+                       KEYWORD_VOCAB_PATH=os.path.join(workdir, "keyword_vocab.json"),
+                       SYNONYM_CACHE_PATH=os.path.join(workdir, "synonym_cache.json"))
+            print(f"Running pipeline on {size} products...", file=sys.stderr)
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run-one", str(size), "--db", args.db,
+                 "--encoder", args.encoder, "--match-workers", str(args.match_workers), "--workdir", workdir],
+                env=env, capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                print(proc.stderr, file=sys.stderr)
+                results[str(size)] = {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"}
+                continue
+            results[str(size)] = json.loads(proc.stdout.strip().splitlines()[-1])
+            print(json.dumps(results[str(size)]["stages_seconds"]), file=sys.stderr)
+
+    write_results("pipeline", {"sizes": args.sizes, "db": args.db, "encoder": args.encoder,
+                                "match_workers": args.match_workers}, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
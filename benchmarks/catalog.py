@@ -0,0 +1,80 @@
+"""Synthetic product catalogs in the data/products.csv schema.
+
+Usage: python benchmarks/catalog.py --size 100000 --output /tmp/products_100k.csv
+
+Categories, brands and description words are sampled from data/products.csv so
+the text statistics (TF-IDF keywords, category sizes) resemble the real
+catalog. The same size and seed always produce the same file.
+"""
+import argparse
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+
+from common import ROOT
+
+SEED_CSV = os.path.join(ROOT, "data", "products.csv")
+COLUMNS = ["product_name", "category", "description", "brand", "is_boycotted"]
+WRITE_CHUNK = 50000
+
+
+def load_vocabulary(path=SEED_CSV):
+    seed = pd.read_csv(path, dtype=str, encoding="utf-8-sig").fillna("")
+    categories = seed["category"].str.strip().str.lower().value_counts()
+    words = pd.Series(" ".join(seed["description"]).replace(",", " ").split()).value_counts()
+    name_words = pd.Series(" ".join(seed["product_name"]).split()).value_counts()
+    return {
+        "categories": categories.index.to_numpy(),
+        "category_weights": (categories / categories.sum()).to_numpy(),
+        "brands": seed["brand"].replace("", "Unknown").unique(),
+        "words": words.index.to_numpy(),
+        "word_weights": (words / words.sum()).to_numpy(),
+        "name_words": name_words.index.to_numpy(),
+        "boycott_rate": float((seed["is_boycotted"].str.strip() == "1").mean()),
+    }
+
+
+def generate(size, seed=0, vocabulary=None):
+    """Yield DataFrame chunks of a synthetic catalog with `size` rows."""
+    vocab = vocabulary or load_vocabulary()
+    rng = np.random.default_rng(seed)
+    for start in range(0, size, WRITE_CHUNK):
+        n = min(WRITE_CHUNK, size - start)
+        categories = rng.choice(vocab["categories"], n, p=vocab["category_weights"])
+        brands = rng.choice(vocab["brands"], n)
+        lengths = rng.integers(4, 12, n)
+        words = rng.choice(vocab["words"], int(lengths.sum()), p=vocab["word_weights"])
+        descriptions = [" ".join(chunk) for chunk in np.split(words, np.cumsum(lengths)[:-1])]
+        name_parts = rng.choice(vocab["name_words"], (n, 2))
+        names = [f"{brand} {a} {b} {start + i}" for i, (brand, (a, b)) in enumerate(zip(brands, name_parts))]
+        yield pd.DataFrame({
+            "product_name": names,
+            "category": categories,
+            "description": descriptions,
+            "brand": brands,
+            "is_boycotted": (rng.random(n) < vocab["boycott_rate"]).astype(int),
+        }, columns=COLUMNS)
+
+
+def write_catalog(path, size, seed=0):
+    header = True
+    for chunk in generate(size, seed):
+        chunk.to_csv(path, mode="w" if header else "a", header=header, index=False, quoting=csv.QUOTE_MINIMAL)
+        header = False
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic products CSV.")
+    parser.add_argument("--size", type=int, required=True, help="number of products (1k to 1M)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+    write_catalog(args.output, args.size, args.seed)
+    print(f"Wrote {args.size} products to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Shared helpers for the benchmark scripts: paths, percentiles and JSON result files."""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Benchmarks import the backend and the offline scripts directly
+for _path in (os.path.join(ROOT, "backend"), os.path.join(ROOT, "scripts")):
+    if _path not in sys.path:
+        sys.path.append(_path)
+
+
+def git_info():
+    def run(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, timeout=10).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
+    return {"commit": run("rev-parse", "HEAD"), "dirty": bool(run("status", "--porcelain", "--untracked-files=no"))}
+
+
+def latency_summary(latencies, errors=0, elapsed=None):
+    """p50/p90/p99/max in milliseconds plus throughput for a list of latencies in seconds."""
+    ms = np.asarray(latencies, dtype=np.float64) * 1000
+    summary = {"requests": int(len(ms)), "errors": int(errors)}
+    if len(ms):
+        summary.update({
+            "p50_ms": round(float(np.percentile(ms, 50)), 3),
+            "p90_ms": round(float(np.percentile(ms, 90)), 3),
+            "p99_ms": round(float(np.percentile(ms, 99)), 3),
+            "max_ms": round(float(ms.max()), 3),
+            "mean_ms": round(float(ms.mean()), 3),
+        })
+    if elapsed:
+        summary["throughput_rps"] = round(len(ms) / elapsed, 2)
+    return summary
+
+
+class StageTimer:
+    """Wall-clock seconds per named stage: `with timer("load"): ...`."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def __call__(self, name):
+        timer = self
+
+        class _Stage:
+            def __enter__(self):
+                self.start = time.perf_counter()
+
+            def __exit__(self, *exc):
+                timer.stages[name] = round(timer.stages.get(name, 0.0) + time.perf_counter() - self.start, 4)
+
+        return _Stage()
+
+
+def write_results(kind, config, results, output=None):
+    """Write a result document and return its path; `output` of '-' prints it instead."""
+    document = {
+        "benchmark": kind,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git": git_info(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": config,
+        "results": results,
+    }
+    text = json.dumps(document, indent=2)
+    if output == "-":
+        print(text)
+        return None
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        commit = (document["git"]["commit"] or "nogit")[:10]
+        output = os.path.join(RESULTS_DIR, f"{kind}-{commit}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w") as f:
+        f.write(text + "\n")
+    print(f"Results written to {output}")
+    return output
@@ -0,0 +1,208 @@
+"""SQLite stand-in for mysql.connector, for benchmarks without a MySQL server.
+
+connect(path) returns an object with the subset of the mysql.connector API the
+app and the offline scripts use: cursor(dictionary=, prepared=), %s parameters,
+lastrowid/rowcount, autocommit, ping(), commit()/rollback(). The MySQL-only
+statements they issue are rewritten (see translate()). Constraints that SQLite
+cannot add after the fact (foreign keys via ALTER, the boycott trigger) are
+skipped, so absolute numbers are only comparable with other SQLite runs.
+"""
+import re
+import sqlite3
+import uuid
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    product_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(255) NOT NULL COLLATE NOCASE,
+    description TEXT,
+    category VARCHAR(100),
+    is_boycotted BOOLEAN NOT NULL,
+    country TEXT,
+    brand TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_name ON products (name);
+CREATE INDEX IF NOT EXISTS idx_category ON products (category);
+CREATE INDEX IF NOT EXISTS idx_is_boycotted ON products (is_boycotted);
+CREATE TABLE IF NOT EXISTS product_embeddings (
+    product_id INTEGER PRIMARY KEY REFERENCES products(product_id) ON DELETE CASCADE,
+    embedding BLOB NOT NULL,
+    content_hash CHAR(64)
+);
+CREATE INDEX IF NOT EXISTS idx_content_hash ON product_embeddings (content_hash);
+CREATE TABLE IF NOT EXISTS product_clusters (
+    product_id INTEGER PRIMARY KEY REFERENCES products(product_id) ON DELETE CASCADE,
+    cluster_id INT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS similarities (
+    sim_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    boycott_id INT NOT NULL REFERENCES products(product_id) ON DELETE CASCADE,
+    alt_id INT NOT NULL REFERENCES products(product_id) ON DELETE CASCADE,
+    cosine_score DOUBLE NOT NULL,
+    CHECK (boycott_id != alt_id)
+);
+CREATE INDEX IF NOT EXISTS idx_boycott_id ON similarities (boycott_id);
+CREATE INDEX IF NOT EXISTS idx_alt_id ON similarities (alt_id);
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id TINYINT PRIMARY KEY,
+    version BIGINT NOT NULL
+);
+INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0);
+"""
+
+_NOOP = re.compile(r"^\s*(ALTER TABLE \w+\s+ADD FOREIGN KEY|CREATE TRIGGER|SET SESSION)", re.I)
+_DELETE_JOIN = re.compile(
+    r"DELETE (\w+) FROM (\w+) \1\s+LEFT JOIN (\w+) (\w+) ON \4\.(\w+) = \1\.(\w+)\s+WHERE \4\.\5 IS NULL", re.I)
+_ON_DUPLICATE = re.compile(r"ON DUPLICATE KEY UPDATE (.*)$", re.I | re.S)
+_INFO_SCHEMA = re.compile(
+    r"information_schema\.columns.*table_name = '(\w+)' AND column_name = '(\w+)'", re.I | re.S)
+
+
+def translate(sql, conn):
+    """MySQL statement -> list of SQLite statements (empty for no-ops)."""
+    stripped = sql.strip().rstrip(";")
+    upper = stripped.upper()
+    if upper.startswith("START TRANSACTION"):
+        return [] if conn.in_transaction else ["BEGIN"]
+    if upper.startswith("SET FOREIGN_KEY_CHECKS"):
+        return [f"PRAGMA foreign_keys = {'ON' if stripped.endswith('1') else 'OFF'}"]
+    if _NOOP.match(stripped):
+        return []
+    if upper.startswith("DROP TABLE IF EXISTS") and "," in stripped:
+        return [f"DROP TABLE IF EXISTS {t.strip()}" for t in stripped[len("DROP TABLE IF EXISTS"):].split(",")]
+    match = re.match(r"CREATE TABLE (\w+) LIKE (\w+)$", stripped, re.I)
+    if match:
+        new, old = match.groups()
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (old,)).fetchone()
+        # Renamed tables keep their new name quoted in sqlite_master
+        statements = [re.sub(rf'^CREATE TABLE "?{old}\b"?', f"CREATE TABLE {new}", row[0])]
+        # Index names are schema-wide in SQLite, so the copies get fresh ones
+        for name, index_sql in conn.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (old,)):
+            statements.append(re.sub(rf'^CREATE INDEX "?{name}"? ON "?{old}\b"?',
+                                     f"CREATE INDEX {name.split('__')[0]}__{uuid.uuid4().hex[:8]} ON {new}", index_sql))
+        return statements
+    if upper.startswith("RENAME TABLE"):
+        pairs = [p.split() for p in stripped[len("RENAME TABLE"):].split(",")]
+        return [f"ALTER TABLE {old} RENAME TO {new}" for old, _, new in pairs]
+    stripped = _DELETE_JOIN.sub(
+        lambda m: f"DELETE FROM {m.group(2)} WHERE {m.group(6)} NOT IN (SELECT {m.group(5)} FROM {m.group(3)})",
+        stripped)
+    stripped = _ON_DUPLICATE.sub(
+        lambda m: "ON CONFLICT DO UPDATE SET " + re.sub(r"VALUES\((\w+)\)", r"excluded.\1", m.group(1)), stripped)
+    return [stripped.replace("%s", "?")]
+
+
+class Cursor:
+    def __init__(self, conn, dictionary=False):
+        self._conn = conn
+        self._dictionary = dictionary
+        self._cursor = conn._db.cursor()
+        self._rows = None  # synthesized result (information_schema)
+        self.lastrowid = None
+        self.rowcount = -1
+
+    def _columns(self, table):
+        return {row[1]: row[2] for row in self._conn._db.execute(f"PRAGMA table_info({table})")}
+
+    def execute(self, sql, params=()):
+        self._rows = None
+        info = _INFO_SCHEMA.search(sql)
+        if info:
+            table, column = info.groups()
+            data_type = self._columns(table).get(column)
+            if re.search(r"COUNT\(\*\) AS (\w+)", sql):
+                name = re.search(r"COUNT\(\*\) AS (\w+)", sql).group(1)
+                self._rows = [{name: int(data_type is not None)}]
+            else:
+                self._rows = [{"data_type": data_type.lower()}] if data_type else []
+            return
+        statements = translate(sql, self._conn._db)
+        for i, statement in enumerate(statements):
+            self._cursor.execute(statement, tuple(params) if i == len(statements) - 1 else ())
+        self.lastrowid = self._cursor.lastrowid
+        self.rowcount = self._cursor.rowcount
+
+    def executemany(self, sql, seq_params):
+        (statement,) = translate(sql, self._conn._db)
+        self._cursor.executemany(statement, [tuple(p) for p in seq_params])
+        self.rowcount = self._cursor.rowcount
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {d[0]: v for d, v in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        if self._rows is not None:
+            row = self._rows.pop(0) if self._rows else None
+            return row if self._dictionary or row is None else tuple(row.values())
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        if self._rows is not None:
+            rows, self._rows = self._rows[:size], self._rows[size:]
+            return rows if self._dictionary else [tuple(r.values()) for r in rows]
+        return [self._row(r) for r in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        if self._rows is not None:
+            rows, self._rows = self._rows, []
+            return rows if self._dictionary else [tuple(r.values()) for r in rows]
+        return [self._row(r) for r in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    def __init__(self, path, timeout=30.0):
+        # Autocommit off by default like mysql.connector; sqlite3 opens
+        # transactions implicitly before DML
+        self._db = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        self._db.execute("PRAGMA foreign_keys = ON")
+
+    @property
+    def autocommit(self):
+        return self._db.isolation_level is None
+
+    @autocommit.setter
+    def autocommit(self, value):
+        self._db.isolation_level = None if value else ""
+
+    @property
+    def in_transaction(self):
+        return self._db.in_transaction
+
+    def cursor(self, dictionary=False, prepared=False, **kwargs):
+        return Cursor(self, dictionary=dictionary)
+
+    def commit(self):
+        self._db.commit()
+
+    def rollback(self):
+        self._db.rollback()
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        self._db.execute("SELECT 1")
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self._db.close()
+
+
+def connect(path, **ignored):
+    """Drop-in for mysql.connector.connect(**db_config); MySQL settings are ignored."""
+    return Connection(path)
+
+
+def create_schema(path):
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    db.commit()
+    db.close()
@@ -0,0 +1,131 @@
+"""Stand-ins for the heavy models so benchmarks run anywhere and measure the code around them.
+
+- install_detector(): a fake `ultralytics.YOLO` that sleeps for a fixed inference
+  time and "detects" the class encoded in the colour of the image centre
+  (see make_image()).
+- install_encoder(): a fake `sentence_transformers.SentenceTransformer` that sums
+  per-word random vectors, so texts sharing words get similar embeddings.
+- install_wordnet(): used only when the NLTK WordNet corpus is not downloaded.
+"""
+import hashlib
+import sys
+import time
+import types
+
+import numpy as np
+
+EMBEDDING_DIM = 384
+COLOR_STEP = 16  # coarse enough to survive JPEG compression
+
+
+def class_color(class_id):
+    """RGB colour the stub detector decodes back to class_id; class ids go up to 4094."""
+    code = class_id + 1
+    digits = (code // 256, (code // 16) % 16, code % 16)
+    return tuple(d * COLOR_STEP + COLOR_STEP // 2 for d in digits)
+
+
+def decode_class(rgb):
+    r, g, b = (min(15, max(0, round((v - COLOR_STEP // 2) / COLOR_STEP))) for v in rgb[:3])
+    return r * 256 + g * 16 + b - 1
+
+
+def make_image(class_id, seed, size=(1600, 1200)):
+    """Textured JPEG-able image: a per-seed random background (so perceptual
+    hashes differ between seeds) with the class colour in the centre."""
+    from PIL import Image
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)
+    img = Image.fromarray(coarse).resize(size, Image.Resampling.BICUBIC)
+    w, h = size
+    img.paste(class_color(class_id), (w * 2 // 5, h * 2 // 5, w * 3 // 5, h * 3 // 5))
+    return img
+
+
+class _Boxes:
+    def __init__(self, classes):
+        self.cls = np.asarray(classes, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.cls)
+
+
+class _Result:
+    def __init__(self, classes):
+        self.boxes = _Boxes(classes)
+
+
+def install_detector(names, inference_ms=30.0, per_image_ms=5.0):
+    """Register a stub `ultralytics` module; each call costs inference_ms + per_image_ms per image."""
+
+    class YOLO:
+        def __init__(self, path):
+            self.path = path
+            self.names = dict(names)
+
+        def __call__(self, images, verbose=True):
+            time.sleep((inference_ms + per_image_ms * len(images)) / 1000)
+            results = []
+            for img in images:
+                class_id = decode_class(img.getpixel((img.width // 2, img.height // 2)))
+                results.append(_Result([class_id] if class_id in self.names else []))
+            return results
+
+    module = types.ModuleType("ultralytics")
+    module.YOLO = YOLO
+    sys.modules["ultralytics"] = module
+    if "torch" not in sys.modules:
+        torch = types.ModuleType("torch")
+        torch.set_num_threads = lambda n: None
+        sys.modules["torch"] = torch
+
+
+def _word_vector(word):
+    seed = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+    return np.random.default_rng(seed).standard_normal(EMBEDDING_DIM).astype(np.float32)
+
+
+def install_encoder():
+    cache = {}
+
+    class SentenceTransformer:
+        def __init__(self, name, **kwargs):
+            self.name = name
+
+        def encode(self, texts, convert_to_tensor=False, **kwargs):
+            out = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+            for i, text in enumerate(texts):
+                for word in text.lower().split():
+                    vector = cache.get(word)
+                    if vector is None:
+                        vector = cache[word] = _word_vector(word)
+                    out[i] += vector
+            norms = np.linalg.norm(out, axis=1, keepdims=True)
+            return out / np.where(norms == 0, 1, norms)
+
+        # embed.py --processes; the stub encodes in-process
+        def start_multi_process_pool(self, target_devices=None):
+            return {"devices": target_devices}
+
+        def encode_multi_process(self, texts, pool, batch_size=32, **kwargs):
+            return self.encode(texts)
+
+        @staticmethod
+        def stop_multi_process_pool(pool):
+            pass
+
+    module = types.ModuleType("sentence_transformers")
+    module.SentenceTransformer = SentenceTransformer
+    sys.modules["sentence_transformers"] = module
+
+
+def install_wordnet():
+    """Use the real WordNet when its corpus is available, otherwise no synonyms."""
+    import keywords
+    try:
+        keywords._wordnet().synsets("test")
+        return "nltk"
+    except Exception:
+        stub = types.SimpleNamespace(get_version=lambda: "stub", synsets=lambda word: [])
+        keywords._wordnet = lambda: stub
+        return "stub"
@@ -0,0 +1,89 @@
+"""Recall of the API's online alternative lookup against an exact scan and the last match.py run.
+
+Usage: python scripts/ann_recall.py [--k 5] [--nprobe 8] [--candidates 100]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from ann_index import AlternativeIndex
+from embedding_store import EmbeddingSnapshot
+from keywords import keyword_matrix, load_vocabulary, pack_rows, tokenize
+from match import get_db_connection
+
+
+def overlap(expected, got):
+    return len(set(expected) & set(got)) / len(expected) if expected else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--k", type=int, default=5, help="alternatives compared per product (the API shows 5)")
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--candidates", type=int, default=100)
+    args = parser.parse_args()
+
+    snapshot = EmbeddingSnapshot.open()
+    vocabulary = load_vocabulary()
+    if snapshot is None or vocabulary is None:
+        sys.exit("Run embed.py and match.py first: no embedding snapshot or keyword vocabulary found.")
+    keywords, term_index = vocabulary
+
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT product_id, description, category, is_boycotted FROM products ORDER BY product_id")
+    products = cursor.fetchall()
+    cursor.execute("SELECT boycott_id, alt_id FROM similarities ORDER BY boycott_id, cosine_score DESC")
+    batch = {}
+    for row in cursor.fetchall():
+        batch.setdefault(row['boycott_id'], []).append(row['alt_id'])
+    cursor.close()
+    conn.close()
+
+    positions = snapshot.positions([p['product_id'] for p in products])
+    products = [dict(p, category=p['category'].strip().lower() if p['category'] else "")
+                for p, pos in zip(products, positions) if pos >= 0]
+    embeddings = snapshot.rows(positions[positions >= 0])
+    bits = pack_rows(keyword_matrix((tokenize(p['description'], p['category']) for p in products),
+                                    term_index, len(keywords)))
+    index = AlternativeIndex.build(products, embeddings, bits, keywords, term_index,
+                                   version=snapshot.version, nprobe=args.nprobe, candidates=args.candidates)
+
+    vs_exact, vs_batch, latencies = [], [], []
+    for i, p in enumerate(products):
+        if not p['is_boycotted']:
+            continue
+        start = time.perf_counter()
+        approx = [a[0] for a in index.alternatives(p['category'], embeddings[i], bits[i])[:args.k]]
+        latencies.append(time.perf_counter() - start)
+        exact = [a[0] for a in index.alternatives(p['category'], embeddings[i], bits[i], exact=True)[:args.k]]
+        for scores, expected in ((vs_exact, exact), (vs_batch, batch.get(p['product_id'], [])[:args.k])):
+            value = overlap(expected, approx)
+            if value is not None:
+                scores.append(value)
+
+    latencies = np.array(latencies) * 1000
+    print(json.dumps({
+        "snapshot_version": snapshot.version,
+        "k": args.k,
+        "nprobe": args.nprobe,
+        "candidates": args.candidates,
+        "boycotted_products": len(latencies),
+        # ANN vs exhaustive scan of the same category partition
+        "recall_vs_exact": float(np.mean(vs_exact)) if vs_exact else None,
+        # Online lookup vs the stored batch results; match.py also prefers the
+        # same cluster, so this is a lower bound on agreement
+        "overlap_vs_batch": float(np.mean(vs_batch)) if vs_batch else None,
+        "latency_ms_p50": float(np.percentile(latencies, 50)) if len(latencies) else None,
+        "latency_ms_p99": float(np.percentile(latencies, 99)) if len(latencies) else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from embedding_store import MODEL_NAME, STORE_DIR
+
+# Saved centroids; products are assigned to the nearest one until drift forces a refit
+CLUSTER_MODEL_PATH = os.environ.get("CLUSTER_MODEL_PATH", os.path.join(STORE_DIR, "clusters.npz"))
+# Refit when the mean squared distance to the assigned centroid grows by more than this fraction
+DRIFT_THRESHOLD = float(os.environ.get("CLUSTER_DRIFT_THRESHOLD", 0.15))
+# Products per cluster the catalog size is divided by
+TARGET_CLUSTER_SIZE = int(os.environ.get("CLUSTER_TARGET_SIZE", 500))
+# match.py compares products within (category, cluster) cells; more clusters than this
+# per category splits candidate pools too thin
+MAX_CLUSTERS_PER_CATEGORY = 4
+MAX_CLUSTERS = int(os.environ.get("CLUSTER_MAX", 1000))
+# Above this many products the fit streams MiniBatchKMeans partial fits instead of KMeans
+FULL_FIT_MAX = 50000
+PARTIAL_FIT_CHUNK = 10000
+ASSIGN_CHUNK = 65536
+
+
+def choose_k(n_products, n_categories):
+    """Number of clusters for a catalog of n_products in n_categories categories.
+
+    Small catalogs keep the original 10 clusters. Larger ones get one cluster per
+    TARGET_CLUSTER_SIZE products, capped at a few clusters per category.
+    """
+    if n_products == 0:
+        return 0
+    n_categories = max(1, n_categories)
+    k = max(min(10, n_products), n_products // TARGET_CLUSTER_SIZE)
+    k = min(k, max(10, n_categories * MAX_CLUSTERS_PER_CATEGORY), MAX_CLUSTERS)
+    return min(k, n_products)
+
+
+def fit(embeddings, k):
+    """Centroids for an (n, dim) matrix, streamed through MiniBatchKMeans above FULL_FIT_MAX rows.
+
+    The matrix may be a memory-mapped snapshot; only the fitted rows are read.
+    """
+    if len(embeddings) <= FULL_FIT_MAX:
+        from sklearn.cluster import KMeans
+        rows = np.asarray(embeddings[0:len(embeddings)], dtype=np.float32)
+        return KMeans(n_clusters=k, random_state=42).fit(rows).cluster_centers_.astype(np.float32)
+
+    from sklearn.cluster import MiniBatchKMeans
+    model = MiniBatchKMeans(n_clusters=k, random_state=42, batch_size=PARTIAL_FIT_CHUNK, n_init=3)
+    # Two passes over a shuffled order; the first chunk must hold at least k rows
+    order = np.random.default_rng(42).permutation(len(embeddings))
+    chunk = max(PARTIAL_FIT_CHUNK, 3 * k)
+    for _ in range(2):
+        for start in range(0, len(order), chunk):
+            rows = np.sort(order[start:start + chunk])
+            if start and len(rows) < k:
+                continue
+            model.partial_fit(np.asarray(embeddings[rows], dtype=np.float32))
+    return model.cluster_centers_.astype(np.float32)
+
+
+def assign(centroids, embeddings):
+    """(nearest centroid index, squared distance to it) per row, computed in chunks."""
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    labels = np.empty(len(embeddings), dtype=np.int32)
+    distances = np.empty(len(embeddings), dtype=np.float32)
+    for start in range(0, len(embeddings), ASSIGN_CHUNK):
+        block = np.asarray(embeddings[start:start + ASSIGN_CHUNK], dtype=np.float32)
+        d = centroid_norms[None, :] - 2 * block @ centroids.T
+        best = d.argmin(axis=1)
+        labels[start:start + len(block)] = best
+        distances[start:start + len(block)] = np.maximum(
+            d[np.arange(len(block)), best] + np.einsum("ij,ij->i", block, block), 0)
+    return labels, distances
+
+
+class ClusterModel:
+    """Centroids plus the fit-time statistics drift is measured against."""
+
+    def __init__(self, centroids, fit_mse, fit_count, model_name=MODEL_NAME, created=None):
+        self.centroids = centroids
+        self.fit_mse = fit_mse
+        self.fit_count = fit_count
+        self.model_name = model_name
+        self.created = created or time.time()
+
+    @property
+    def k(self):
+        return len(self.centroids)
+
+    @classmethod
+    def load(cls, path=CLUSTER_MODEL_PATH):
+        try:
+            with np.load(path) as data:
+                meta = json.loads(str(data["meta"]))
+                return cls(data["centroids"], meta["fit_mse"], meta["fit_count"], meta["model_name"], meta["created"])
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def save(self, path=CLUSTER_MODEL_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        meta = {"fit_mse": self.fit_mse, "fit_count": self.fit_count,
+                "model_name": self.model_name, "created": self.created}
+        tmp = f"{path}.tmp-{os.getpid()}.npz"
+        np.savez(tmp, centroids=self.centroids, meta=np.array(json.dumps(meta)))
+        os.replace(tmp, path)
+
+    def refit_reason(self, embeddings, mse, target_k):
+        """Why the saved centroids no longer fit the catalog, or None."""
+        if self.model_name != MODEL_NAME or self.centroids.shape[1] != embeddings.shape[1]:
+            return "embedding model changed"
+        if self.fit_mse > 0 and mse > self.fit_mse * (1 + DRIFT_THRESHOLD):
+            return f"drift {mse / self.fit_mse - 1:.1%} above {DRIFT_THRESHOLD:.0%}"
+        # The catalog grew or shrank enough that the cluster count is off by half
+        if abs(target_k - self.k) > 0.5 * self.k:
+            return f"catalog size now calls for {target_k} clusters instead of {self.k}"
+        return None
+
+
+def cluster(embeddings, n_categories, model=None, force=False):
+    """Assign every row to a cluster, refitting only when needed.
+
+    Returns (labels, model, reason) where reason is None when the saved
+    centroids were reused and says why they were refit otherwise.
+    """
+    target_k = choose_k(len(embeddings), n_categories)
+    if force:
+        reason = "forced"
+    elif model is None:
+        reason = "no saved centroids"
+    else:
+        labels, distances = assign(model.centroids, embeddings)
+        reason = model.refit_reason(embeddings, float(distances.mean()), target_k)
+        if reason is None:
+            return labels, model, None
+    centroids = fit(embeddings, target_k)
+    labels, distances = assign(centroids, embeddings)
+    return labels, ClusterModel(centroids, float(distances.mean()), len(embeddings)), reason
@@ -1,10 +1,14 @@
+import argparse
+import os
+import time
 import mysql.connector
 from mysql.connector import Error
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.cluster import KMeans
 import logging
 import json
+from clustering import ClusterModel, cluster
+from embedding_store import (MODEL_NAME, STORE_DTYPE, EmbeddingSnapshot, SnapshotWriter, content_hash, current_version,
+                             decode_blobs, encode_blob, product_text)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -17,6 +21,15 @@ db_config = {
     "database": "DB_NAME"
 }
 
+# Products read, encoded and written per round trip; bounds memory regardless of catalog size
+EMBED_CHUNK_SIZE = int(os.environ.get("EMBED_CHUNK_SIZE", 4096))
+# Texts per forward pass of the model
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 64))
+# CPU encoder processes; 1 encodes in this process
+EMBED_PROCESSES = int(os.environ.get("EMBED_PROCESSES", 1))
+# Rows per multi-row INSERT
+WRITE_BATCH_SIZE = 1000
+
 def get_db_connection():
     try:
         conn = mysql.connector.connect(**db_config)
@@ -26,70 +39,317 @@ def get_db_connection():
         logging.error(f"Error connecting to database: {e}")
         raise
 
-def main():
+def embedding_column_type(cursor, column):
+    cursor.execute(f"""
+        SELECT data_type FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = 'product_embeddings' AND column_name = '{column}'
+    """)
+    row = cursor.fetchone()
+    return row['data_type'].lower() if row else None
+
+def migrate_json_embeddings(cursor):
+    # Older databases store embeddings as JSON arrays; rewrite them as float32 BLOBs.
+    # Every ALTER commits on its own, so each step checks what an interrupted run already did:
+    # embedding_bin left behind means the migration has not finished
+    embedding = embedding_column_type(cursor, 'embedding')
+    embedding_bin = embedding_column_type(cursor, 'embedding_bin')
+    if embedding != 'json' and embedding_bin is None:
+        return
+    logging.info("Converting product_embeddings.embedding from JSON to BLOB...")
+    if embedding == 'json':
+        if embedding_bin is None:
+            cursor.execute("ALTER TABLE product_embeddings ADD COLUMN embedding_bin BLOB NULL")
+        cursor.execute("SELECT product_id, embedding FROM product_embeddings WHERE embedding_bin IS NULL")
+        rows = cursor.fetchall()
+        cursor.executemany(
+            "UPDATE product_embeddings SET embedding_bin = %s WHERE product_id = %s",
+            [(encode_blob(json.loads(r['embedding'])), r['product_id']) for r in rows],
+        )
+        cursor.execute("ALTER TABLE product_embeddings DROP COLUMN embedding")
+    cursor.execute("ALTER TABLE product_embeddings CHANGE COLUMN embedding_bin embedding BLOB NOT NULL")
+
+def ensure_schema(cursor):
+    migrate_json_embeddings(cursor)
+    # Databases created before content hashing lack the column
+    cursor.execute("""
+        SELECT COUNT(*) AS n FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = 'product_embeddings' AND column_name = 'content_hash'
+    """)
+    if cursor.fetchone()['n'] == 0:
+        logging.info("Adding content_hash column to product_embeddings...")
+        cursor.execute("""
+            ALTER TABLE product_embeddings
+                ADD COLUMN content_hash CHAR(64) NULL,
+                ADD INDEX idx_content_hash (content_hash)
+        """)
+
+def prune_deleted(cursor):
+    # Embeddings and clusters of products that no longer exist
+    cursor.execute("""
+        DELETE e FROM product_embeddings e
+        LEFT JOIN products p ON p.product_id = e.product_id
+        WHERE p.product_id IS NULL
+    """)
+    pruned = cursor.rowcount
+    cursor.execute("""
+        DELETE c FROM product_clusters c
+        LEFT JOIN products p ON p.product_id = c.product_id
+        WHERE p.product_id IS NULL
+    """)
+    return pruned
+
+class Encoder:
+    """Sentence encoder loaded on first use.
+
+    Texts go through model.encode in batches of batch_size; with processes > 1
+    they are spread over a sentence-transformers multi-process pool of CPU
+    workers instead, started once and reused for every chunk.
+    """
+
+    def __init__(self, batch_size=EMBED_BATCH_SIZE, processes=EMBED_PROCESSES):
+        self.batch_size = batch_size
+        self.processes = processes
+        self.model = None
+        self.pool = None
+        self.encoded = 0
+        self.seconds = 0.0
+
+    def encode(self, texts):
+        if self.model is None:
+            # Only load the model when there is something to encode
+            from sentence_transformers import SentenceTransformer
+            logging.info(f"Loading {MODEL_NAME}...")
+            self.model = SentenceTransformer(MODEL_NAME, trust_remote_code=True)
+            if self.processes > 1:
+                logging.info(f"Starting {self.processes} encoder processes...")
+                self.pool = self.model.start_multi_process_pool(["cpu"] * self.processes)
+        start = time.perf_counter()
+        if self.pool is not None:
+            embeddings = self.model.encode_multi_process(texts, self.pool, batch_size=self.batch_size)
+        else:
+            embeddings = self.model.encode(texts, batch_size=self.batch_size, convert_to_tensor=False,
+                                           show_progress_bar=False)
+        self.seconds += time.perf_counter() - start
+        self.encoded += len(texts)
+        return embeddings
+
+    @property
+    def rate(self):
+        return self.encoded / self.seconds if self.seconds else 0.0
+
+    def close(self):
+        if self.pool is not None:
+            self.model.stop_multi_process_pool(self.pool)
+            self.pool = None
+
+def stream_rows(conn, query, chunk_size=EMBED_CHUNK_SIZE):
+    """Yield lists of up to chunk_size rows from an unbuffered cursor.
+
+    The server streams the result instead of the client holding it all; the
+    connection cannot run other statements until the generator is exhausted,
+    so writes go through a second connection.
+    """
+    cursor = conn.cursor(dictionary=True, buffered=False)
     try:
-        # Connect to database
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
 
-        # Clear previous embeddings and clusters
-        logging.info("Clearing previous embeddings and clusters...")
-        cursor.execute("DELETE FROM product_embeddings")
-        cursor.execute("DELETE FROM product_clusters")
-        conn.commit()
+def _in_clause(values):
+    return ", ".join(["%s"] * len(values))
 
-        # Fetch products
-        logging.info("Fetching products from the database...")
-        cursor.execute("SELECT product_id, name, description, category FROM products")
-        products = cursor.fetchall()
+def encode_changed(cursor, products, encoder=None):
+    """Upsert embeddings for products whose text hash changed; returns how many were written.
 
-        if not products:
-            logging.error("No products found in the database.")
-            raise ValueError("Products table is empty.")
+    Called once per chunk of the product stream, so hash lookups, encoding and
+    writes all stay proportional to the chunk.
+    """
+    if not products:
+        return 0
+    ids = [row['product_id'] for row in products]
+    cursor.execute(f"SELECT product_id, content_hash FROM product_embeddings WHERE product_id IN ({_in_clause(ids)})", ids)
+    stored = {row['product_id']: row['content_hash'] for row in cursor.fetchall()}
+
+    hashes = {row['product_id']: content_hash(product_text(row)) for row in products}
+    changed = [row for row in products if stored.get(row['product_id']) != hashes[row['product_id']]]
+    if not changed:
+        return 0
+
+    # Reuse embeddings already stored under the same hash (duplicate or re-added products)
+    needed = sorted({hashes[row['product_id']] for row in changed})
+    known = {}
+    for start in range(0, len(needed), 1000):
+        chunk = needed[start:start + 1000]
+        cursor.execute(f"SELECT content_hash, embedding FROM product_embeddings WHERE content_hash IN ({_in_clause(chunk)})", chunk)
+        for row in cursor.fetchall():
+            known.setdefault(row['content_hash'], row['embedding'])
+
+    to_encode = {}
+    for row in changed:
+        h = hashes[row['product_id']]
+        if h not in known:
+            to_encode.setdefault(h, product_text(row))
+
+    if to_encode:
+        encoder = encoder or Encoder()
+        embeddings = encoder.encode(list(to_encode.values()))
+        for h, emb in zip(to_encode, embeddings):
+            known[h] = encode_blob(emb)  # Raw float32 bytes
 
-        # Generate text for embeddings
-        texts = [f"{row['name']} {row['description'] if row['description'] else ''} {row['category'] if row['category'] else ''}" for row in products]
-        product_ids = [row['product_id'] for row in products]
-        logging.info(f"Fetched {len(product_ids)} products.")
-
-        # Generate embeddings
-        logging.info("Generating embeddings with Alibaba-NLP/gte-large-en-v1.5...")
-        model = SentenceTransformer("all-MiniLM-L6-v2", trust_remote_code=True)
-        embeddings = model.encode(texts, convert_to_tensor=False)
-
-        # Perform K-Means clustering
-        num_clusters = min(10, len(products))  # Use 10 clusters or fewer if dataset is small
-        logging.info(f"Clustering products into {num_clusters} clusters...")
-        kmeans = KMeans(n_clusters=num_clusters, random_state=42)
-        cluster_labels = kmeans.fit_predict(embeddings)
-
-        # Insert embeddings
-        logging.info("Inserting embeddings into product_embeddings table...")
-        for pid, emb in zip(product_ids, embeddings):
-            emb_json = json.dumps(emb.tolist())  # Store as JSON
-            cursor.execute("""
-                INSERT INTO product_embeddings (product_id, embedding)
+    rows = [(row['product_id'], known[hashes[row['product_id']]], hashes[row['product_id']]) for row in changed]
+    # Multi-row INSERTs bounded in size so no statement outgrows max_allowed_packet
+    for start in range(0, len(rows), WRITE_BATCH_SIZE):
+        cursor.executemany("""
+            INSERT INTO product_embeddings (product_id, embedding, content_hash)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE embedding = VALUES(embedding), content_hash = VALUES(content_hash)
+        """, rows[start:start + WRITE_BATCH_SIZE])
+    return len(changed)
+
+def write_embedding_snapshot(read_conn, chunk_size=EMBED_CHUNK_SIZE):
+    """Stream product_embeddings into a new memory-mapped snapshot; returns its version.
+
+    Count and rows are read in one consistent-snapshot transaction, so
+    concurrent inserts by the API's online matcher cannot change the row count
+    halfway through.
+    """
+    cursor = read_conn.cursor(dictionary=True)
+    cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+    try:
+        cursor.execute("SELECT COUNT(*) AS n FROM product_embeddings")
+        count = cursor.fetchone()['n']
+        cursor.close()
+        writer = SnapshotWriter(count, dtype=STORE_DTYPE)
+        for rows in stream_rows(read_conn, "SELECT product_id, embedding FROM product_embeddings ORDER BY product_id", chunk_size):
+            writer.write([row['product_id'] for row in rows], decode_blobs([row['embedding'] for row in rows]))
+    finally:
+        read_conn.commit()
+    return writer.publish()
+
+def update_clusters(cursor, product_ids, embeddings, n_categories, force=False):
+    """Assign products to the saved centroids, refitting them only on drift; returns (refit, rows written).
+
+    product_ids must be sorted (as in a snapshot); embeddings may be the
+    snapshot's memory-mapped matrix.
+    """
+    model = ClusterModel.load()
+    labels, model, reason = cluster(embeddings, n_categories, model=model, force=force)
+    if reason is not None:
+        logging.info(f"Clustering products into {model.k} clusters ({reason})...")
+        model.save()
+        # Replace cluster assignments, converting NumPy int32 to Python int
+        cursor.execute("DELETE FROM product_clusters")
+        for start in range(0, len(product_ids), WRITE_BATCH_SIZE):
+            cursor.executemany("""
+                INSERT INTO product_clusters (product_id, cluster_id)
                 VALUES (%s, %s)
-            """, (pid, emb_json))
+            """, list(zip(product_ids[start:start + WRITE_BATCH_SIZE].tolist(),
+                          labels[start:start + WRITE_BATCH_SIZE].tolist())))
+        return True, len(product_ids)
 
-        # Insert cluster assignments, converting NumPy int32 to Python int
-        logging.info("Inserting cluster assignments into product_clusters table...")
-        for pid, cluster_id in zip(product_ids, cluster_labels):
-            cursor.execute("""
+    # Same centroids: only new products and products whose embedding moved change rows.
+    # Stored assignments are compared one id range at a time.
+    written = 0
+    for start in range(0, len(product_ids), EMBED_CHUNK_SIZE):
+        ids = product_ids[start:start + EMBED_CHUNK_SIZE].tolist()
+        cursor.execute("SELECT product_id, cluster_id FROM product_clusters WHERE product_id BETWEEN %s AND %s",
+                       (ids[0], ids[-1]))
+        stored = {row['product_id']: row['cluster_id'] for row in cursor.fetchall()}
+        rows = [(pid, label) for pid, label in zip(ids, labels[start:start + EMBED_CHUNK_SIZE].tolist())
+                if stored.get(pid) != label]
+        if rows:
+            cursor.executemany("""
                 INSERT INTO product_clusters (product_id, cluster_id)
                 VALUES (%s, %s)
-            """, (pid, int(cluster_id)))  # Convert NumPy int32 to Python int
+                ON DUPLICATE KEY UPDATE cluster_id = VALUES(cluster_id)
+            """, rows)
+        written += len(rows)
+    logging.info(f"Assigned products to the {model.k} saved clusters, {written} assignments changed.")
+    return False, written
 
+def category_count(cursor):
+    cursor.execute("SELECT COUNT(DISTINCT LOWER(TRIM(COALESCE(category, '')))) AS n FROM products")
+    return cursor.fetchone()['n']
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Embed new and changed products and assign them to clusters.")
+    parser.add_argument("--recluster", action="store_true", help="refit the cluster centroids even without drift")
+    parser.add_argument("--chunk-size", type=int, default=EMBED_CHUNK_SIZE, help="products per read/encode/write chunk")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="texts per model forward pass")
+    parser.add_argument("--processes", type=int, default=EMBED_PROCESSES, help="CPU encoder processes")
+    args = parser.parse_args(argv)
+
+    conn = None
+    read_conn = None
+    cursor = None
+    encoder = Encoder(args.batch_size, args.processes)
+    try:
+        # One connection streams rows, the other writes while the stream is open
+        conn = get_db_connection()
+        read_conn = get_db_connection()
+        # The product stream pauses while a chunk is encoded; keep the server from timing it out
+        read_cursor = read_conn.cursor()
+        read_cursor.execute("SET SESSION net_write_timeout = 3600")
+        read_cursor.close()
+        cursor = conn.cursor(dictionary=True)
+        ensure_schema(cursor)
+
+        cursor.execute("SELECT COUNT(*) AS n FROM products")
+        total = cursor.fetchone()['n']
+        if not total:
+            logging.error("No products found in the database.")
+            raise ValueError("Products table is empty.")
+
+        pruned = prune_deleted(cursor)
         conn.commit()
-        logging.info(f"Successfully inserted {len(product_ids)} embeddings and cluster assignments.")
+
+        # Each chunk is committed once written, so an interrupted run resumes
+        # from the stored content hashes
+        logging.info(f"Streaming {total} products in chunks of {args.chunk_size}...")
+        seen = written = 0
+        start = time.perf_counter()
+        for products in stream_rows(read_conn, "SELECT product_id, name, description, category FROM products ORDER BY product_id",
+                                    args.chunk_size):
+            written += encode_changed(cursor, products, encoder)
+            conn.commit()
+            seen += len(products)
+            logging.info(f"{seen}/{total} products checked, {written} embeddings written, {encoder.encoded} texts encoded "
+                         f"({encoder.rate:.0f} texts/s encoding, {seen / (time.perf_counter() - start):.0f} products/s overall).")
+        logging.info(f"Pruned {pruned} embeddings of deleted products, wrote {written} embeddings.")
+
+        cursor.execute("SELECT COUNT(*) AS n FROM product_clusters")
+        clustered = cursor.fetchone()['n']
+        if pruned or written or clustered != seen or current_version() is None or args.recluster:
+            # Memory-mapped snapshot for match.py and the API; clustering reads its rows from the mapping
+            version = write_embedding_snapshot(read_conn, args.chunk_size)
+            snapshot = EmbeddingSnapshot.open(version=version)
+            logging.info(f"Published embedding snapshot v{version} ({len(snapshot)} x {snapshot.matrix.shape[1]}, {STORE_DTYPE}).")
+            update_clusters(cursor, snapshot.ids, snapshot.embeddings, category_count(cursor), force=args.recluster)
+        else:
+            logging.info("Catalog unchanged since the last run, keeping existing clusters and snapshot.")
+
+        conn.commit()
+        logging.info(f"Embeddings and cluster assignments are up to date for {seen} products.")
 
     except Exception as e:
         logging.error(f"An error occurred: {e}")
+        if conn is not None:
+            conn.rollback()
         raise
     finally:
-        cursor.close()
-        conn.close()
-        logging.info("Database connection closed.")
+        encoder.close()
+        if cursor is not None:
+            cursor.close()
+        if read_conn is not None:
+            read_conn.close()
+        if conn is not None:
+            conn.close()
+            logging.info("Database connection closed.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+# Versioned embedding snapshots: <root>/v000001/{ids.npy, embeddings.npy, scales.npy, meta.json}
+# plus a CURRENT file naming the published version
+STORE_DIR = os.environ.get(
+    "EMBEDDING_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "embeddings"),
+)
+STORE_DTYPE = os.environ.get("EMBEDDING_STORE_DTYPE", "float32")
+KEEP_SNAPSHOTS = 2
+DTYPES = ("float32", "float16", "int8")
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+def product_text(row):
+    return f"{row['name']} {row['description'] if row['description'] else ''} {row['category'] if row['category'] else ''}"
+
+
+def content_hash(text):
+    # The model name is part of the key so switching models re-encodes everything
+    return hashlib.sha256(f"{MODEL_NAME}\0{text}".encode("utf-8")).hexdigest()
+
+
+def encode_blob(vector):
+    """Embedding -> raw float32 bytes for the product_embeddings BLOB column."""
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def decode_blobs(blobs):
+    """Stack BLOB column values into an (n, dim) float32 matrix without per-row parsing."""
+    if not blobs:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(len(blobs), -1)
+
+
+def quantize(embeddings, dtype):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if dtype == "float32":
+        return embeddings, None
+    if dtype == "float16":
+        return embeddings.astype(np.float16), None
+    if dtype == "int8":
+        # Symmetric per-row scale
+        scales = np.abs(embeddings).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        q = np.clip(np.rint(embeddings / scales[:, None]), -127, 127).astype(np.int8)
+        return q, scales.astype(np.float32)
+    raise ValueError(f"Unsupported embedding dtype {dtype!r}, expected one of {DTYPES}")
+
+
+def _version_dir(root, version):
+    return os.path.join(root, f"v{version:06d}")
+
+
+def current_version(root=STORE_DIR):
+    try:
+        with open(os.path.join(root, "CURRENT")) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def write_snapshot(product_ids, embeddings, dtype=STORE_DTYPE, root=STORE_DIR, extra=None):
+    """Write a new snapshot, publish it as CURRENT and return its version."""
+    # Sorted ids let readers locate rows with searchsorted instead of a dict
+    ids = np.asarray(product_ids, dtype=np.int64)
+    order = np.argsort(ids, kind="stable")
+    embeddings = np.asarray(embeddings)
+    writer = SnapshotWriter(len(ids), dtype=dtype, root=root, extra=extra)
+    if len(ids):
+        writer.write(ids[order], embeddings[order])
+    elif embeddings.ndim == 2:
+        writer.dim = embeddings.shape[1]
+    return writer.publish()
+
+
+class SnapshotWriter:
+    """Builds a snapshot chunk by chunk in memory-mapped files, so writing one
+    never needs the whole matrix in memory.
+
+    The row count is fixed up front; chunks must arrive in ascending product id
+    order and fill exactly `count` rows before publish().
+    """
+
+    def __init__(self, count, dtype=STORE_DTYPE, root=STORE_DIR, extra=None):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported embedding dtype {dtype!r}, expected one of {DTYPES}")
+        os.makedirs(root, exist_ok=True)
+        self.existing = [int(d[1:]) for d in os.listdir(root) if d.startswith("v") and d[1:].isdigit()]
+        self.version = max(self.existing, default=0) + 1
+        self.count = count
+        self.dtype = dtype
+        self.root = root
+        self.extra = extra
+        self.dim = 0
+        self.written = 0
+        self.tmp = os.path.join(root, f".tmp-{self.version}-{os.getpid()}")
+        os.makedirs(self.tmp)
+        self.ids = np.lib.format.open_memmap(os.path.join(self.tmp, "ids.npy"), mode="w+",
+                                             dtype=np.int64, shape=(count,))
+        self.matrix = self.scales = None
+
+    def _allocate(self, dim):
+        self.dim = dim
+        self.matrix = np.lib.format.open_memmap(os.path.join(self.tmp, "embeddings.npy"), mode="w+",
+                                                dtype=np.dtype(self.dtype), shape=(self.count, dim))
+        if self.dtype == "int8":
+            self.scales = np.lib.format.open_memmap(os.path.join(self.tmp, "scales.npy"), mode="w+",
+                                                    dtype=np.float32, shape=(self.count,))
+
+    def write(self, product_ids, embeddings):
+        ids = np.asarray(product_ids, dtype=np.int64)
+        if not len(ids):
+            return
+        start, stop = self.written, self.written + len(ids)
+        if stop > self.count:
+            raise ValueError(f"Snapshot v{self.version} expects {self.count} rows, got more")
+        if (ids[1:] <= ids[:-1]).any() or (start and ids[0] <= self.ids[start - 1]):
+            raise ValueError("Snapshot rows must be written in ascending product id order")
+        matrix, scales = quantize(embeddings, self.dtype)
+        if self.matrix is None:
+            self._allocate(matrix.shape[1])
+        self.ids[start:stop] = ids
+        self.matrix[start:stop] = matrix
+        if scales is not None:
+            self.scales[start:stop] = scales
+        self.written = stop
+
+    def publish(self):
+        """Flush the files, publish the snapshot as CURRENT and return its version."""
+        if self.written != self.count:
+            shutil.rmtree(self.tmp, ignore_errors=True)
+            raise ValueError(f"Snapshot v{self.version} expects {self.count} rows, got {self.written}")
+        if self.matrix is None:
+            # Empty catalog: np.load still needs a 2-d matrix
+            np.save(os.path.join(self.tmp, "embeddings.npy"), np.zeros((0, self.dim), dtype=self.dtype))
+            if self.dtype == "int8":
+                np.save(os.path.join(self.tmp, "scales.npy"), np.zeros(0, dtype=np.float32))
+        for array in (self.ids, self.matrix, self.scales):
+            if array is not None:
+                array.flush()
+        self.ids = self.matrix = self.scales = None
+        meta = {
+            "version": self.version,
+            "count": int(self.count),
+            "dim": int(self.dim),
+            "dtype": self.dtype,
+            "created": time.time(),
+        }
+        meta.update(self.extra or {})
+        with open(os.path.join(self.tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        os.rename(self.tmp, _version_dir(self.root, self.version))
+
+        pointer = os.path.join(self.root, f".CURRENT-{os.getpid()}")
+        with open(pointer, "w") as f:
+            f.write(str(self.version))
+        os.replace(pointer, os.path.join(self.root, "CURRENT"))
+
+        # Old snapshots may still be mapped by running readers; keep a few around
+        for old in sorted(self.existing)[:-(KEEP_SNAPSHOTS - 1) or None]:
+            shutil.rmtree(_version_dir(self.root, old), ignore_errors=True)
+        return self.version
+
+
+class EmbeddingSnapshot:
+    """Read-only, memory-mapped view of one published snapshot."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.version = self.meta["version"]
+        self.dtype = self.meta["dtype"]
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        self.matrix = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        scales_path = os.path.join(path, "scales.npy")
+        self.scales = np.load(scales_path, mmap_mode="r") if os.path.exists(scales_path) else None
+
+    @classmethod
+    def open(cls, root=STORE_DIR, version=None):
+        """Open the CURRENT (or a given) snapshot; returns None when there is none."""
+        version = current_version(root) if version is None else version
+        if version is None or not os.path.isdir(_version_dir(root, version)):
+            return None
+        return cls(_version_dir(root, version))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def positions(self, product_ids):
+        """Row positions of product_ids, -1 where a product is not in the snapshot."""
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        pos = np.searchsorted(self.ids, product_ids)
+        pos[pos >= len(self.ids)] = 0
+        found = len(self.ids) > 0 and np.asarray(self.ids)[pos] == product_ids
+        return np.where(found, pos, -1)
+
+    def rows(self, positions):
+        """float32 embeddings for row positions (dequantized when stored as int8/float16)."""
+        data = np.asarray(self.matrix[positions], dtype=np.float32)
+        if self.scales is not None:
+            data *= np.asarray(self.scales[positions])[:, None]
+        return data
+
+    @property
+    def embeddings(self):
+        """(n, dim) float32 rows for code that slices a whole matrix, read from the mapping on demand."""
+        if self.scales is None and self.matrix.dtype == np.float32:
+            return self.matrix
+        return _DequantizedRows(self)
+
+    def get(self, product_ids):
+        """float32 embeddings for product_ids; raises KeyError when any is missing."""
+        pos = self.positions(product_ids)
+        if (pos < 0).any():
+            raise KeyError(f"{int((pos < 0).sum())} products are not in embedding snapshot v{self.version}")
+        return self.rows(pos)
+
+
+class _DequantizedRows:
+    """Array-like float32 view of an int8/float16 snapshot; indexing dequantizes only the rows asked for."""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.shape = snapshot.matrix.shape
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        return self.snapshot.rows(index)
@@ -0,0 +1,144 @@
+import json
+import os
+
+import numpy as np
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+# WordNet expansions are cached here between runs
+SYNONYM_CACHE_PATH = os.environ.get("SYNONYM_CACHE_PATH", os.path.join(_DATA_DIR, "synonym_cache.json"))
+# Keyword vocabulary of the last match.py run, reused by the API's online matcher
+KEYWORD_VOCAB_PATH = os.environ.get("KEYWORD_VOCAB_PATH", os.path.join(_DATA_DIR, "keyword_vocab.json"))
+
+
+def _wordnet():
+    from nltk.corpus import wordnet
+    return wordnet
+
+
+class SynonymCache:
+    """Memoized keyword -> synonym set expansion, persisted as JSON."""
+
+    def __init__(self, path=SYNONYM_CACHE_PATH):
+        self.path = path
+        self._synonyms = {}
+        self._dirty = False
+        self._version = None
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+                self._version = data.get("wordnet")
+                self._synonyms = {w: set(s) for w, s in data.get("synonyms", {}).items()}
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable synonym cache {path}: {e}")
+        if self._synonyms:
+            self._check_version()
+
+    def _check_version(self):
+        # A fully cached run never reaches get()'s check, so compare once on load
+        try:
+            version = _wordnet().get_version()
+        except LookupError:
+            return  # Corpus not installed; cached entries are all there is
+        if self._version != version:
+            print(f"Synonym cache was built with WordNet {self._version}, now {version}; discarding it.")
+            self._synonyms = {}
+            self._version = version
+            self._dirty = True
+
+    def get(self, word):
+        synonyms = self._synonyms.get(word)
+        if synonyms is None:
+            wordnet = _wordnet()
+            version = wordnet.get_version()
+            if self._version not in (None, version):
+                # A different WordNet release invalidates everything cached so far
+                self._synonyms = {}
+            self._version = version
+            synonyms = set()
+            for syn in wordnet.synsets(word):
+                for lemma in syn.lemmas():
+                    synonyms.add(lemma.name().lower().replace('_', ' '))
+            self._synonyms[word] = synonyms
+            self._dirty = True
+        return synonyms
+
+    def save(self):
+        if not self._dirty or not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"wordnet": self._version,
+                       "synonyms": {w: sorted(s) for w, s in self._synonyms.items()}}, f)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+
+def tokenize(description, category):
+    return set(f"{description} {category}".lower().split()) if description else set(category.lower().split())
+
+
+def build_term_index(keywords, synonyms):
+    """Inverted index term -> keyword ids, over each keyword and its synonyms.
+
+    Products are matched on whitespace-split words, so multi-word terms can never
+    match and are left out.
+    """
+    index = {}
+    for k, keyword in enumerate(keywords):
+        for term in synonyms.get(keyword) | {keyword}:
+            if ' ' not in term:
+                index.setdefault(term, []).append(k)
+    return index
+
+
+def keyword_matrix(token_sets, term_index, n_keywords):
+    """Binary CSR matrix with one row per token set, built in one pass over the tokens."""
+    from scipy.sparse import csr_matrix
+    indptr = [0]
+    indices = []
+    for tokens in token_sets:
+        row = set()
+        for token in tokens:
+            row.update(term_index.get(token, ()))
+        indices.extend(sorted(row))
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.uint8)
+    return csr_matrix((data, np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+                      shape=(len(indptr) - 1, n_keywords))
+
+
+def pack_rows(matrix, chunk_size=65536):
+    """Bit-pack a binary CSR matrix row-wise, densifying one chunk at a time."""
+    n_bytes = (matrix.shape[1] + 7) // 8
+    packed = np.empty((matrix.shape[0], n_bytes), dtype=np.uint8)
+    for start in range(0, matrix.shape[0], chunk_size):
+        dense = matrix[start:start + chunk_size].toarray().astype(bool)
+        packed[start:start + chunk_size] = np.packbits(dense, axis=1)
+    return packed
+
+
+def keyword_bits(tokens, term_index, n_keywords):
+    """Packed keyword bits for a single product, same layout as pack_rows."""
+    row = np.zeros(n_keywords, dtype=bool)
+    for token in tokens:
+        for k in term_index.get(token, ()):
+            row[k] = True
+    return np.packbits(row)
+
+
+def save_vocabulary(keywords, term_index, path=KEYWORD_VOCAB_PATH):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"keywords": list(keywords), "term_index": term_index}, f)
+    os.replace(tmp, path)
+
+
+def load_vocabulary(path=KEYWORD_VOCAB_PATH):
+    """(keywords, term_index) saved by match.py, or None before its first run."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data["keywords"], data["term_index"]
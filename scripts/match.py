@@ -1,128 +1,435 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
 import mysql.connector
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.feature_extraction.text import TfidfVectorizer
-from nltk.corpus import wordnet
-import nltk
-import json
+from embedding_store import EmbeddingSnapshot, decode_blobs
+from scoring import SIMILARITY_THRESHOLD, normalize_rows, score_block
+from keywords import SynonymCache, build_term_index, keyword_matrix, pack_rows, save_vocabulary, tokenize
+from schema import boycott_trigger_sql
 
-# Connect to database
-conn = mysql.connector.connect(
-    host="DB_HOST",
-    user="DB_USER",
-    password="DB_PASS",
-    database="DB_NAME"
+# Upper bound on the (boycotted x candidates x keyword bytes) popcount temporary
+MAX_BLOCK_BYTES = 64 * 1024 * 1024
+# Rows per multi-row INSERT into the staging table
+INSERT_BATCH_SIZE = 5000
+# Per-shard results are kept here until they are published, so a failed run can resume
+CHECKPOINT_DIR = os.environ.get(
+    "MATCH_CHECKPOINT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "match_checkpoint"),
 )
-cursor = conn.cursor(dictionary=True)
-
-# Clear previous similarity data
-cursor.execute("DELETE FROM similarities")
-conn.commit()
-
-# Function to get synonyms for keyword enhancement
-def get_synonyms(word):
-    synonyms = set()
-    for syn in wordnet.synsets(word):
-        for lemma in syn.lemmas():
-            synonyms.add(lemma.name().lower().replace('_', ' '))
-    return synonyms
-
-# Load product data including embeddings, clusters, and metadata
-cursor.execute("""
-    SELECT p.product_id, p.is_boycotted, e.embedding, p.name, p.description, p.category, c.cluster_id
-    FROM products p
-    JOIN product_embeddings e ON p.product_id = e.product_id
-    JOIN product_clusters c ON p.product_id = c.product_id
-""")
-records = cursor.fetchall()
-
-# Standardize categories and parse embeddings
-for r in records:
-    r['category'] = r['category'].strip().lower() if r['category'] else ""
-    r['embedding'] = np.array(json.loads(r['embedding']), dtype=np.float32)
-
-# Separate boycotted and non-boycotted products
-boycott = [(r['product_id'], r['embedding'], r['name'], r['description'], r['category'], r['cluster_id']) 
-           for r in records if r['is_boycotted']]
-non_boycott = [(r['product_id'], r['embedding'], r['name'], r['description'], r['category'], r['cluster_id']) 
-               for r in records if not r['is_boycotted']]
-
-# Compute TF-IDF to find important keywords, including category
-descriptions_with_category = [f"{r['description']} {r['category']}" if r['description'] else r['category'] for r in records]
-vectorizer = TfidfVectorizer(stop_words='english', min_df=2)
-tfidf_matrix = vectorizer.fit_transform(descriptions_with_category)
-feature_names = vectorizer.get_feature_names_out()
-
-# Ensure category-related keywords are included
-target_keywords = {'spread', 'nut spread', 'butter', 'chocolate', 'snack'}
-for kw in list(target_keywords):
-    target_keywords.update(get_synonyms(kw))
-max_tfidf = tfidf_matrix.max(axis=0).toarray()[0]
-keywords = [feature_names[i] for i in range(len(max_tfidf)) if max_tfidf[i] > 0.2]
-keywords = list(set(keywords) | target_keywords)
-
-# Create binary keyword vectors
-keyword_vectors = []
-for desc, cat in zip([r['description'] for r in records], [r['category'] for r in records]):
-    words = set(f"{desc} {cat}".lower().split()) if desc else set(cat.lower().split())
-    vec = np.array([1 if any(kw in words for kw in get_synonyms(keyword) | {keyword}) else 0 for keyword in keywords])
-    keyword_vectors.append(vec)
-
-# Assign keyword vectors to boycott and non-boycott lists
-boycott = [(bid, b_emb, b_name, b_desc, b_cat, b_cluster, keyword_vectors[i]) 
-           for i, (bid, b_emb, b_name, b_desc, b_cat, b_cluster) in enumerate(boycott)]
-non_boycott = [(nid, n_emb, n_name, n_desc, n_cat, n_cluster, keyword_vectors[i + len(boycott)]) 
-               for i, (nid, n_emb, n_name, n_desc, n_cat, n_cluster) in enumerate(non_boycott)]
-
-# Calculate similarities with clustering and flexible number of alternatives
-ALPHA = 0.65  # Balanced weight for embedding similarity
-SIMILARITY_THRESHOLD = 0.30 # Lowered to 45% for smoother matching
-for bid, b_emb, b_name, b_desc, b_cat, b_cluster, b_kw_vec in boycott:
-    alternatives = []
-    
-    # Prioritize products in the same cluster and category
-    same_cluster_category_products = [(nid, n_emb, n_name, n_desc, n_cat, n_cluster, n_kw_vec) 
-                                     for nid, n_emb, n_name, n_desc, n_cat, n_cluster, n_kw_vec in non_boycott 
-                                     if n_cluster == b_cluster and n_cat == b_cat]
-    
-    # Fall back to same category if no matches in cluster
-    if not same_cluster_category_products:
-        same_cluster_category_products = [(nid, n_emb, n_name, n_desc, n_cat, n_cluster, n_kw_vec) 
-                                         for nid, n_emb, n_name, n_desc, n_cat, n_cluster, n_kw_vec in non_boycott 
-                                         if n_cat == b_cat]
-    
-    if not same_cluster_category_products:
-        print(f"No non-boycotted products found in category '{b_cat}' for boycotted product ID {bid} (Name: {b_name}).")
-        continue
-    
-    for nid, n_emb, n_name, n_desc, n_cat, n_cluster, n_kw_vec in same_cluster_category_products:
-        # Compute cosine similarity
-        cos_sim = cosine_similarity([b_emb], [n_emb])[0][0]
-        # Compute Jaccard similarity for keywords
-        intersection = np.sum(b_kw_vec & n_kw_vec)
-        union = np.sum(b_kw_vec | n_kw_vec)
-        jac_sim = intersection / union if union > 0 else 0
-        # Compute combined similarity
-        combined_sim = ALPHA * cos_sim + (1 - ALPHA) * jac_sim
-        if combined_sim >= SIMILARITY_THRESHOLD:
-            alternatives.append((nid, combined_sim, cos_sim, jac_sim, n_name, n_cat))
-    
-    # Sort alternatives by combined similarity descending
-    alternatives.sort(key=lambda x: x[1], reverse=True)
-    
-    # Insert all alternatives that meet the threshold
-    for nid, combined_sim, _, _, _, _ in alternatives:
-        cursor.execute("""
-            INSERT INTO similarities (boycott_id, alt_id, cosine_score)
+MATCH_WORKERS = int(os.environ.get("MATCH_WORKERS", 0)) or os.cpu_count() or 1
+SHARD_DTYPE = np.dtype([('boycott_id', '<i8'), ('alt_id', '<i8'),
+                        ('combined', '<f8'), ('cos', '<f8'), ('jac', '<f8')])
+
+def get_db_connection():
+    return mysql.connector.connect(
+        host="DB_HOST",
+        user="DB_USER",
+        password="DB_PASS",
+        database="DB_NAME"
+    )
+
+def load_records(cursor):
+    """Product rows plus an (n, dim) float32 embedding matrix aligned with them."""
+    # Load product metadata and clusters for every embedded product
+    cursor.execute("""
+        SELECT p.product_id, p.is_boycotted, p.name, p.description, p.category, c.cluster_id
+        FROM products p
+        JOIN product_embeddings e ON p.product_id = e.product_id
+        JOIN product_clusters c ON p.product_id = c.product_id
+        ORDER BY p.product_id
+    """)
+    records = cursor.fetchall()
+
+    # Standardize categories
+    for r in records:
+        r['category'] = r['category'].strip().lower() if r['category'] else ""
+
+    # Embeddings come from the memory-mapped snapshot written by embed.py; the
+    # BLOB column is the fallback when the snapshot is missing or out of date
+    ids = [r['product_id'] for r in records]
+    snapshot = EmbeddingSnapshot.open()
+    if snapshot is not None:
+        try:
+            embeddings = snapshot.get(ids)
+            print(f"Loaded {len(ids)} embeddings from snapshot v{snapshot.version}.")
+            return records, embeddings
+        except KeyError as e:
+            print(f"Embedding snapshot is out of date ({e}), reading the database instead.")
+    cursor.execute("SELECT product_id, embedding FROM product_embeddings ORDER BY product_id")
+    blobs = {row['product_id']: row['embedding'] for row in cursor.fetchall()}
+    return records, decode_blobs([blobs[pid] for pid in ids])
+
+def build_keyword_vectors(records, synonyms=None):
+    synonyms = synonyms or SynonymCache()
+    # Compute TF-IDF to find important keywords, including category
+    descriptions_with_category = [f"{r['description']} {r['category']}" if r['description'] else r['category'] for r in records]
+    vectorizer = TfidfVectorizer(stop_words='english', min_df=2)
+    tfidf_matrix = vectorizer.fit_transform(descriptions_with_category)
+    feature_names = vectorizer.get_feature_names_out()
+
+    # Ensure category-related keywords are included
+    target_keywords = {'spread', 'nut spread', 'butter', 'chocolate', 'snack'}
+    for kw in list(target_keywords):
+        target_keywords.update(synonyms.get(kw))
+    max_tfidf = tfidf_matrix.max(axis=0).toarray()[0]
+    keywords = [feature_names[i] for i in range(len(max_tfidf)) if max_tfidf[i] > 0.2]
+    keywords = sorted(set(keywords) | target_keywords)
+
+    # Binary keyword matrix, one row per record: each description token is
+    # looked up once in the term -> keyword inverted index
+    term_index = build_term_index(keywords, synonyms)
+    synonyms.save()
+    save_vocabulary(keywords, term_index)
+    matrix = keyword_matrix((tokenize(r['description'], r['category']) for r in records), term_index, len(keywords))
+    return matrix, keywords
+
+def group_indices(keys):
+    groups = {}
+    for i, key in enumerate(keys):
+        groups.setdefault(key, []).append(i)
+    return {key: np.array(idx, dtype=np.int64) for key, idx in groups.items()}
+
+def find_alternatives(records, embeddings, keyword_matrix):
+    """Yield (record index, [(candidate index, combined, cos, jac), ...]) per boycotted product.
+
+    Boycotted products are grouped by (category, cluster) and each group is
+    scored against its candidates with one matrix product for cosine and
+    bit-packed popcounts for Jaccard.
+    """
+    embeddings = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+    bits = pack_rows(keyword_matrix)
+    bit_counts = np.bitwise_count(bits).sum(axis=1, dtype=np.int32)
+
+    is_boycotted = np.array([bool(r['is_boycotted']) for r in records])
+    cells = [(r['category'], r['cluster_id']) for r in records]
+    boycott_idx = np.nonzero(is_boycotted)[0]
+    non_boycott_idx = np.nonzero(~is_boycotted)[0]
+
+    # Candidate pools: same cluster and category first, same category as fallback
+    by_cell = {key: non_boycott_idx[idx] for key, idx in group_indices([cells[i] for i in non_boycott_idx]).items()}
+    by_category = {key: non_boycott_idx[idx] for key, idx in group_indices([cells[i][0] for i in non_boycott_idx]).items()}
+
+    for (category, cluster), idx in group_indices([cells[i] for i in boycott_idx]).items():
+        group = boycott_idx[idx]
+        candidates = by_cell.get((category, cluster))
+        if candidates is None:
+            candidates = by_category.get(category)
+        if candidates is None:
+            for b in group:
+                yield b, None
+            continue
+
+        n_emb, n_bits, n_count = embeddings[candidates], bits[candidates], bit_counts[candidates]
+        rows_per_block = max(1, MAX_BLOCK_BYTES // max(1, len(candidates) * bits.shape[1]))
+        for start in range(0, len(group), rows_per_block):
+            block = group[start:start + rows_per_block]
+            combined_sim, cos_sim, jac_sim = score_block(
+                embeddings[block], bits[block], bit_counts[block], n_emb, n_bits, n_count
+            )
+            mask = combined_sim >= SIMILARITY_THRESHOLD
+            for row, b in enumerate(block):
+                hits = np.nonzero(mask[row])[0]
+                # Sort alternatives by combined similarity descending, ties keep candidate order
+                hits = hits[np.argsort(-combined_sim[row, hits], kind='stable')]
+                yield b, [(candidates[h], combined_sim[row, h], cos_sim[row, h], jac_sim[row, h]) for h in hits]
+
+class SimilarityLoader:
+    """Bulk-loads alternatives into a staging table and swaps it in atomically.
+
+    The live similarities table keeps serving the previous results until
+    publish(); a failed run leaves it untouched.
+    """
+
+    def __init__(self, conn, batch_size=INSERT_BATCH_SIZE):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.batch_size = batch_size
+        self.pending = []
+        self.rows_written = 0
+
+    def create_staging(self):
+        self.cursor.execute("DROP TABLE IF EXISTS similarities_staging, similarities_old")
+        # Copies columns, indexes and the CHECK constraint; no foreign keys and no trigger,
+        # so bulk inserts are not validated row by row
+        self.cursor.execute("CREATE TABLE similarities_staging LIKE similarities")
+
+    def add(self, rows):
+        self.pending.extend(rows)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        # executemany rewrites this into multi-row INSERT statements
+        self.cursor.executemany("""
+            INSERT INTO similarities_staging (boycott_id, alt_id, cosine_score)
             VALUES (%s, %s, %s)
-        """, (bid, nid, float(combined_sim)))
-    
-    # Debug output
-    print(f"Found {len(alternatives)} alternatives for boycotted product ID {bid} (Name: {b_name}, Category: {b_cat}, Cluster: {b_cluster})")
-    for alt in alternatives:
-        print(f"Alternative ID {alt[0]} (Name: {alt[4]}, Category: {alt[5]}): combined_sim={alt[1]:.3f}, cos_sim={alt[2]:.3f}, jac_sim={alt[3]:.3f}")
-
-conn.commit()
-cursor.close()
-conn.close()
-print("Updated similarities with BERT embeddings, clustering, 45% similarity threshold, and no limit on alternatives.")
+        """, self.pending)
+        self.conn.commit()
+        self.rows_written += len(self.pending)
+        self.pending = []
+
+    def validate(self):
+        # One set-based check replaces the per-row trigger lookups
+        self.cursor.execute("""
+            SELECT COUNT(*)
+            FROM similarities_staging s
+            LEFT JOIN products b ON b.product_id = s.boycott_id
+            LEFT JOIN products a ON a.product_id = s.alt_id
+            WHERE b.product_id IS NULL OR a.product_id IS NULL
+               OR b.is_boycotted = FALSE OR a.is_boycotted = TRUE
+        """)
+        invalid = self.cursor.fetchone()[0]
+        if invalid:
+            raise ValueError(f"{invalid} staged similarities reference missing products or have the wrong boycott status")
+
+    def publish(self):
+        self.flush()
+        self.validate()
+        self.cursor.execute("""
+            ALTER TABLE similarities_staging
+                ADD FOREIGN KEY (boycott_id) REFERENCES products(product_id) ON DELETE CASCADE,
+                ADD FOREIGN KEY (alt_id) REFERENCES products(product_id) ON DELETE CASCADE
+        """)
+        # Both renames happen atomically; readers see the old or the new table, never neither.
+        # The trigger moves with the old table, so the live table keeps it if the swap fails
+        self.cursor.execute("RENAME TABLE similarities TO similarities_old, similarities_staging TO similarities")
+        # Trigger names are schema-wide, so move it from the old table to the new one
+        self.cursor.execute("DROP TRIGGER IF EXISTS check_boycott_status")
+        self.cursor.execute(boycott_trigger_sql("similarities"))
+        self.cursor.execute("DROP TABLE similarities_old")
+
+    def discard(self):
+        self.pending = []
+        self.cursor.execute("DROP TABLE IF EXISTS similarities_staging")
+        # A failure between the swap and the trigger move leaves the live table
+        # without its trigger; recreating it is harmless otherwise
+        self.cursor.execute("DROP TRIGGER IF EXISTS check_boycott_status")
+        self.cursor.execute(boycott_trigger_sql("similarities"))
+
+    def close(self):
+        self.cursor.close()
+
+def run_key(records, embeddings, keyword_matrix, keywords):
+    """Fingerprint of the job's inputs; checkpointed shards are only reused for identical inputs."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps([[r['product_id'], bool(r['is_boycotted']), r['category'], r['cluster_id']]
+                         for r in records]).encode())
+    h.update(memoryview(np.ascontiguousarray(embeddings)))
+    h.update(keyword_matrix.indptr.tobytes())
+    h.update(keyword_matrix.indices.tobytes())
+    h.update(json.dumps([list(keywords), SIMILARITY_THRESHOLD]).encode())
+    return h.hexdigest()
+
+def plan_shards(records):
+    """[(shard id, category, record indices)] for every category with boycotted products.
+
+    Candidates never cross categories, so each shard is scored independently
+    and gives the same alternatives as a single pass over all records.
+    """
+    by_category = group_indices([r['category'] for r in records])
+    shards = []
+    # load_records() maps NULL categories to "", but rows passed in directly may still hold None
+    for shard_id, category in enumerate(sorted(by_category, key=lambda c: (c is None, c or ""))):
+        idx = by_category[category]
+        if any(records[i]['is_boycotted'] for i in idx):
+            shards.append((shard_id, category, idx))
+    return shards
+
+def shard_cost(records, idx):
+    boycotted = sum(1 for i in idx if records[i]['is_boycotted'])
+    return boycotted * (len(idx) - boycotted + 1)
+
+def run_shard(path, records, embeddings, keyword_matrix):
+    """Score one shard and write its alternatives to path as a structured .npy array.
+
+    Runs in a worker process; returns a summary for the manifest.
+    """
+    start = time.perf_counter()
+    rows, no_candidates, boycotted = [], [], 0
+    for b, alternatives in find_alternatives(records, embeddings, keyword_matrix):
+        boycotted += 1
+        bid = records[b]['product_id']
+        if alternatives is None:
+            no_candidates.append(bid)
+            continue
+        rows.extend((bid, records[n]['product_id'], combined, cos, jac) for n, combined, cos, jac in alternatives)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, np.array(rows, dtype=SHARD_DTYPE))
+    os.replace(tmp, path)
+    return {"rows": len(rows), "boycotted": boycotted, "no_candidates": no_candidates,
+            "seconds": round(time.perf_counter() - start, 3)}
+
+class Checkpoint:
+    """Shard result files plus a manifest of the completed shards.
+
+    A run whose inputs hash to the same key as the manifest skips the shards
+    it lists; any other run starts over. Only the checkpoint's own files are
+    ever deleted, so the directory may be shared with other data.
+    """
+
+    def __init__(self, directory, key, fresh=False):
+        self.directory = directory
+        self.key = key
+        manifest = None if fresh else self._read()
+        if manifest is None or manifest.get("key") != key:
+            self.clear()
+            manifest = {"key": key, "shards": {}}
+        os.makedirs(directory, exist_ok=True)
+        self.manifest = manifest
+
+    def _read(self):
+        try:
+            with open(os.path.join(self.directory, "manifest.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def path(self, shard_id):
+        return os.path.join(self.directory, f"shard-{shard_id:05d}.npy")
+
+    def is_done(self, shard_id):
+        return str(shard_id) in self.manifest["shards"] and os.path.exists(self.path(shard_id))
+
+    def complete(self, shard_id, category, summary):
+        self.manifest["shards"][str(shard_id)] = dict(summary, category=category)
+        tmp = os.path.join(self.directory, "manifest.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp, os.path.join(self.directory, "manifest.json"))
+
+    def load(self, shard_id):
+        return np.load(self.path(shard_id))
+
+    @staticmethod
+    def _owned(name):
+        return name in ("manifest.json", "manifest.json.tmp") or (
+            name.startswith("shard-") and name.endswith((".npy", ".npy.tmp")))
+
+    def clear(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if self._owned(name):
+                os.remove(os.path.join(self.directory, name))
+        try:
+            os.rmdir(self.directory)  # Only succeeds once nothing else is left
+        except OSError:
+            pass
+
+def shard_inputs(records, embeddings, keyword_matrix, idx):
+    # Workers only need the fields find_alternatives() reads
+    fields = ('product_id', 'is_boycotted', 'category', 'cluster_id')
+    return [{k: records[i][k] for k in fields} for i in idx], embeddings[idx], keyword_matrix[idx]
+
+def run_shards(shards, records, embeddings, keyword_matrix, checkpoint, workers):
+    """Run every shard the checkpoint does not already have, largest first."""
+    todo = sorted((s for s in shards if not checkpoint.is_done(s[0])),
+                  key=lambda s: -shard_cost(records, s[2]))
+    total, done = len(shards), len(shards) - len(todo)
+
+    def finished(shard_id, category, summary):
+        nonlocal done
+        done += 1
+        checkpoint.complete(shard_id, category, summary)
+        print(f"Shard {done}/{total} '{category}': {summary['boycotted']} boycotted products, "
+              f"{summary['rows']} alternatives in {summary['seconds']:.2f}s")
+
+    if workers <= 1:
+        for shard_id, category, idx in todo:
+            finished(shard_id, category, run_shard(checkpoint.path(shard_id),
+                                                   *shard_inputs(records, embeddings, keyword_matrix, idx)))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # A bounded number of shards in flight keeps the copies sent to workers small
+        queued, running = iter(todo), {}
+        while True:
+            for shard_id, category, idx in queued:
+                future = pool.submit(run_shard, checkpoint.path(shard_id),
+                                     *shard_inputs(records, embeddings, keyword_matrix, idx))
+                running[future] = (shard_id, category)
+                if len(running) >= 2 * workers:
+                    break
+            if not running:
+                break
+            completed, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in completed:
+                shard_id, category = running.pop(future)
+                finished(shard_id, category, future.result())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find non-boycotted alternatives for boycotted products.")
+    parser.add_argument("--workers", type=int, default=MATCH_WORKERS,
+                        help="worker processes for the category shards (default: MATCH_WORKERS or the CPU count)")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR,
+                        help="where shard results are kept until published (default: data/match_checkpoint)")
+    parser.add_argument("--fresh", action="store_true", help="ignore the results of an interrupted run")
+    parser.add_argument("--verbose", action="store_true", help="print every product's alternatives")
+    args = parser.parse_args(argv)
+
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    records, embeddings = load_records(cursor)
+    keyword_matrix, keywords = build_keyword_vectors(records)
+
+    shards = plan_shards(records)
+    checkpoint = Checkpoint(args.checkpoint_dir, run_key(records, embeddings, keyword_matrix, keywords), args.fresh)
+    resumed = sum(1 for s in shards if checkpoint.is_done(s[0]))
+    print(f"Matching {len(shards)} category shards with {args.workers} workers"
+          + (f", resuming with {resumed} already done." if resumed else "."))
+    run_shards(shards, records, embeddings, keyword_matrix, checkpoint, args.workers)
+
+    # The live similarities table is only replaced once every shard has succeeded
+    conn.ping(reconnect=True)
+    by_id = {r['product_id']: r for r in records}
+    loader = SimilarityLoader(conn)
+    loader.create_staging()
+    try:
+        for shard_id, category, _ in shards:
+            rows = checkpoint.load(shard_id)
+            boycott_ids, alt_ids, scores = rows['boycott_id'].tolist(), rows['alt_id'].tolist(), rows['combined'].tolist()
+            for start in range(0, len(rows), loader.batch_size):
+                end = start + loader.batch_size
+                loader.add(list(zip(boycott_ids[start:end], alt_ids[start:end], scores[start:end])))
+            if args.verbose:
+                print_shard(checkpoint.manifest["shards"][str(shard_id)], rows, by_id)
+        loader.publish()
+    except Exception:
+        loader.discard()
+        raise
+    finally:
+        loader.close()
+
+    # Publish a new catalog version so the API reloads its cached alternatives
+    cursor.execute("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+    conn.commit()
+    cursor.close()
+    conn.close()
+    checkpoint.clear()
+    print(f"Updated similarities ({loader.rows_written} rows) with BERT embeddings, clustering, 45% similarity threshold, and no limit on alternatives.")
+
+def print_shard(summary, rows, by_id):
+    for bid in summary["no_candidates"]:
+        b = by_id[bid]
+        print(f"No non-boycotted products found in category '{b['category']}' for boycotted product ID {bid} (Name: {b['name']}).")
+    starts = np.flatnonzero(np.r_[True, rows['boycott_id'][1:] != rows['boycott_id'][:-1]]) if len(rows) else []
+    for start, end in zip(starts, list(starts[1:]) + [len(rows)]):
+        b = by_id[int(rows['boycott_id'][start])]
+        print(f"Found {end - start} alternatives for boycotted product ID {b['product_id']} (Name: {b['name']}, Category: {b['category']}, Cluster: {b['cluster_id']})")
+        for row in rows[start:end]:
+            alt = by_id[int(row['alt_id'])]
+            print(f"Alternative ID {alt['product_id']} (Name: {alt['name']}, Category: {alt['category']}): combined_sim={row['combined']:.3f}, cos_sim={row['cos']:.3f}, jac_sim={row['jac']:.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+# Shared DDL for the scripts that create or rebuild tables
+
+def boycott_trigger_sql(table="similarities"):
+    # Trigger to enforce boycott_id and alt_id constraints
+    return f"""
+        CREATE TRIGGER check_boycott_status
+        BEFORE INSERT ON {table}
+        FOR EACH ROW
+        BEGIN
+            DECLARE boycott_status BOOLEAN;
+            DECLARE alt_status BOOLEAN;
+
+            SELECT is_boycotted INTO boycott_status
+            FROM products
+            WHERE product_id = NEW.boycott_id;
+
+            SELECT is_boycotted INTO alt_status
+            FROM products
+            WHERE product_id = NEW.alt_id;
+
+            IF boycott_status IS NULL OR alt_status IS NULL THEN
+                SIGNAL SQLSTATE '45000'
+                SET MESSAGE_TEXT = 'Invalid product_id in boycott_id or alt_id';
+            ELSEIF boycott_status = FALSE THEN
+                SIGNAL SQLSTATE '45000'
+                SET MESSAGE_TEXT = 'boycott_id must reference a boycotted product';
+            ELSEIF alt_status = TRUE THEN
+                SIGNAL SQLSTATE '45000'
+                SET MESSAGE_TEXT = 'alt_id must reference a non-boycotted product';
+            END IF;
+        END;
+    """
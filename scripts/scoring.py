@@ -0,0 +1,19 @@
+# Combined embedding/keyword similarity shared by match.py and the API's online matcher
+import numpy as np
+
+ALPHA = 0.65  # Balanced weight for embedding similarity
+SIMILARITY_THRESHOLD = 0.30 # Lowered to 45% for smoother matching
+
+def normalize_rows(matrix):
+    # Same convention as sklearn's cosine_similarity: zero vectors score 0
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+def score_block(b_emb, b_bits, b_count, n_emb, n_bits, n_count):
+    """Combined cosine/Jaccard scores for every (boycotted, candidate) pair of a block."""
+    cos_sim = b_emb @ n_emb.T
+    intersection = np.bitwise_count(b_bits[:, None, :] & n_bits[None, :, :]).sum(axis=2, dtype=np.int32)
+    union = b_count[:, None] + n_count[None, :] - intersection
+    jac_sim = np.divide(intersection, union, out=np.zeros(intersection.shape, dtype=np.float32), where=union > 0)
+    combined_sim = ALPHA * cos_sim + (1 - ALPHA) * jac_sim
+    return combined_sim, cos_sim, jac_sim
@@ -1,170 +1,255 @@
+import argparse
 import pandas as pd
 import mysql.connector
 from mysql.connector import Error
 import os
+from schema import boycott_trigger_sql
 
 # Configurable data file path
 DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "products.csv")
 
-try:
-    products_df = pd.read_csv(DATA_PATH)
-except FileNotFoundError as e:
-    print(f"Error: CSV file not found - {e}. Please ensure '{DATA_PATH}' exists.")
-    exit(1)
-except pd.errors.EmptyDataError:
-    print("Error: products.csv is empty. Please check the contents.")
-    exit(1)
-except pd.errors.ParserError as e:
-    print(f"Error: Unable to parse products.csv - {e}. Check for correct formatting and headers.")
-    exit(1)
-except Exception as e:
-    print(f"Unexpected error loading products.csv: {e}")
-    exit(1)
-
-try:
-    conn = mysql.connector.connect(
-        host="DB_HOST",
-        user="DB_USER",
-        password="DB_PASS",
-        database="DB_NAME"
-    )
-    cursor = conn.cursor()
-except Error as e:
-    print(f"Error connecting to MySQL database: {e}. Ensure MySQL is running, 'recsys' database exists, and credentials are correct.")
-    exit(1)
-
-try:
-    cursor.execute("SET FOREIGN_KEY_CHECKS = 0;")
-    cursor.execute("DROP TABLE IF EXISTS similarities;")
-    cursor.execute("DROP TABLE IF EXISTS product_clusters;")
-    cursor.execute("DROP TABLE IF EXISTS product_embeddings;")
-    cursor.execute("DROP TABLE IF EXISTS products;")
-    cursor.execute("SET FOREIGN_KEY_CHECKS = 1;")
-except Error as e:
-    print(f"Error dropping tables: {e}. Check if you have permission to drop tables.")
-    conn.close()
-    exit(1)
-
-try:
-    # Create products table
-    cursor.execute("""
-        CREATE TABLE products (
-            product_id INT AUTO_INCREMENT PRIMARY KEY,
-            name VARCHAR(255) NOT NULL,
-            description TEXT,
-            category VARCHAR(100),
-            is_boycotted BOOLEAN NOT NULL,
-            country TEXT,
-            brand TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            INDEX idx_category (category),
-            INDEX idx_is_boycotted (is_boycotted)
-        );
-    """)
-
-    # Create product_embeddings table with cascading foreign key
-    cursor.execute("""
-        CREATE TABLE product_embeddings (
-            product_id INT PRIMARY KEY,
-            embedding JSON NOT NULL,
-            FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
-        );
-    """)
-
-    # Create product_clusters table with cascading foreign key
-    cursor.execute("""
-        CREATE TABLE product_clusters (
-            product_id INT PRIMARY KEY,
-            cluster_id INT NOT NULL,
-            FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
-        );
-    """)
-
-    # Create similarities table with cascading foreign keys and indexes
-    cursor.execute("""
-        CREATE TABLE similarities (
-            sim_id INT AUTO_INCREMENT PRIMARY KEY,
-            boycott_id INT NOT NULL,
-            alt_id INT NOT NULL,
-            cosine_score DOUBLE NOT NULL,
-            FOREIGN KEY (boycott_id) REFERENCES products(product_id) ON DELETE CASCADE,
-            FOREIGN KEY (alt_id) REFERENCES products(product_id) ON DELETE CASCADE,
-            CHECK (boycott_id != alt_id),
-            INDEX idx_boycott_id (boycott_id),
-            INDEX idx_alt_id (alt_id)
-        );
-    """)
-
-    # Create trigger to enforce boycott_id and alt_id constraints
-    cursor.execute("""
-        CREATE TRIGGER check_boycott_status
-        BEFORE INSERT ON similarities
-        FOR EACH ROW
-        BEGIN
-            DECLARE boycott_status BOOLEAN;
-            DECLARE alt_status BOOLEAN;
-            
-            SELECT is_boycotted INTO boycott_status
-            FROM products
-            WHERE product_id = NEW.boycott_id;
-            
-            SELECT is_boycotted INTO alt_status
-            FROM products
-            WHERE product_id = NEW.alt_id;
-            
-            IF boycott_status IS NULL OR alt_status IS NULL THEN
-                SIGNAL SQLSTATE '45000'
-                SET MESSAGE_TEXT = 'Invalid product_id in boycott_id or alt_id';
-            ELSEIF boycott_status = FALSE THEN
-                SIGNAL SQLSTATE '45000'
-                SET MESSAGE_TEXT = 'boycott_id must reference a boycotted product';
-            ELSEIF alt_status = TRUE THEN
-                SIGNAL SQLSTATE '45000'
-                SET MESSAGE_TEXT = 'alt_id must reference a non-boycotted product';
-            END IF;
-        END;
-    """)
-
-except Error as e:
-    print(f"Error creating tables or trigger: {e}. Verify database connection and SQL syntax.")
-    conn.close()
-    exit(1)
-
-try:
-    for index, row in products_df.iterrows():
-        name = row.get("product_name", "Unknown")
-        desc = row.get("description", "")
-        category = row.get("category", "")
-        is_boycotted = bool(row.get("is_boycotted", False))
-        country = row.get("country", "Unknown")
-        brand = row.get("brand", "Unknown")
+# Rows read from the CSV at a time; memory use does not grow with the file size
+CHUNK_SIZE = int(os.environ.get("INGEST_CHUNK_SIZE", 5000))
+# Rows per multi-row INSERT and rows between commits
+INSERT_BATCH_SIZE = 1000
+COMMIT_EVERY = 20000
 
+COLUMNS = ["name", "description", "category", "is_boycotted", "country", "brand"]
+TRUE_VALUES = {"1", "1.0", "true", "t", "yes", "y"}
+
+INSERT_SQL = """
+    INSERT INTO products (name, description, category, is_boycotted, country, brand)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+UPDATE_SQL = """
+    UPDATE products SET description = %s, category = %s, is_boycotted = %s, country = %s, brand = %s
+    WHERE name = %s
+"""
+
+
+def recreate_tables(conn, cursor):
+    try:
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0;")
+        cursor.execute("DROP TABLE IF EXISTS similarities;")
+        cursor.execute("DROP TABLE IF EXISTS similarities_staging;")
+        cursor.execute("DROP TABLE IF EXISTS similarities_old;")
+        cursor.execute("DROP TABLE IF EXISTS product_clusters;")
+        cursor.execute("DROP TABLE IF EXISTS product_embeddings;")
+        cursor.execute("DROP TABLE IF EXISTS products;")
+        cursor.execute("DROP TABLE IF EXISTS catalog_version;")
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1;")
+    except Error as e:
+        print(f"Error dropping tables: {e}. Check if you have permission to drop tables.")
+        conn.close()
+        exit(1)
+
+    try:
+        # Create products table
         cursor.execute("""
-            INSERT INTO products (name, description, category, is_boycotted, country, brand)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (name, desc, category, is_boycotted, country, brand))
-except KeyError as e:
-    print(f"Error: Missing column in DataFrame - {e}. Ensure CSV contains 'product_name', 'description', 'category', 'is_boycotted', 'country', 'brand'.")
-    conn.rollback()
-    conn.close()
-    exit(1)
-except ValueError as e:
-    print(f"Error: Invalid data type in DataFrame - {e}. Check that 'is_boycotted' is boolean-compatible.")
-    conn.rollback()
-    conn.close()
-    exit(1)
-except Error as e:
-    print(f"Error inserting data: {e}. Check for special characters or data mismatches.")
-    conn.rollback()
-    conn.close()
-    exit(1)
-
-try:
-    conn.commit()
-    print(f"Successfully inserted {len(products_df)} products into the database.")
-except Error as e:
-    print(f"Error committing transaction: {e}. Rolling back changes.")
-    conn.rollback()
-finally:
-    cursor.close()
-    conn.close()
+            CREATE TABLE products (
+                product_id INT AUTO_INCREMENT PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                description TEXT,
+                category VARCHAR(100),
+                is_boycotted BOOLEAN NOT NULL,
+                country TEXT,
+                brand TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_name (name),
+                INDEX idx_category (category),
+                INDEX idx_is_boycotted (is_boycotted)
+            );
+        """)
+
+        # Create product_embeddings table with cascading foreign key
+        cursor.execute("""
+            CREATE TABLE product_embeddings (
+                product_id INT PRIMARY KEY,
+                embedding BLOB NOT NULL,
+                content_hash CHAR(64),
+                INDEX idx_content_hash (content_hash),
+                FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+            );
+        """)
+
+        # Create product_clusters table with cascading foreign key
+        cursor.execute("""
+            CREATE TABLE product_clusters (
+                product_id INT PRIMARY KEY,
+                cluster_id INT NOT NULL,
+                FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+            );
+        """)
+
+        # Create similarities table with cascading foreign keys and indexes
+        cursor.execute("""
+            CREATE TABLE similarities (
+                sim_id INT AUTO_INCREMENT PRIMARY KEY,
+                boycott_id INT NOT NULL,
+                alt_id INT NOT NULL,
+                cosine_score DOUBLE NOT NULL,
+                FOREIGN KEY (boycott_id) REFERENCES products(product_id) ON DELETE CASCADE,
+                FOREIGN KEY (alt_id) REFERENCES products(product_id) ON DELETE CASCADE,
+                CHECK (boycott_id != alt_id),
+                INDEX idx_boycott_id (boycott_id),
+                INDEX idx_alt_id (alt_id)
+            );
+        """)
+
+        # Create catalog version table, bumped whenever products or similarities change
+        # so the API can reload its in-memory catalog snapshot
+        cursor.execute("""
+            CREATE TABLE catalog_version (
+                id TINYINT PRIMARY KEY,
+                version BIGINT NOT NULL
+            );
+        """)
+        cursor.execute("INSERT INTO catalog_version (id, version) VALUES (1, 0);")
+
+        # Create trigger to enforce boycott_id and alt_id constraints
+        cursor.execute(boycott_trigger_sql())
+
+    except Error as e:
+        print(f"Error creating tables or trigger: {e}. Verify database connection and SQL syntax.")
+        conn.close()
+        exit(1)
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    """Iterate over the CSV in DataFrame chunks of at most chunk_size rows."""
+    # Everything is read as text and cleaned per chunk; utf-8-sig drops the BOM
+    # in front of the first header
+    return pd.read_csv(path, dtype=str, chunksize=chunk_size, encoding="utf-8-sig")
+
+
+def clean_chunk(chunk):
+    """Vectorized cleaning of one CSV chunk into the products column layout."""
+    if "product_name" not in chunk.columns:
+        raise KeyError("product_name")
+
+    def column(name, default):
+        if name not in chunk.columns:
+            return pd.Series(default, index=chunk.index, dtype=object)
+        values = chunk[name].str.strip()
+        return values.where(values != "").fillna(default)
+
+    cleaned = pd.DataFrame({
+        "name": column("product_name", "Unknown").str.slice(0, 255),
+        "description": column("description", ""),
+        "category": column("category", "").str.slice(0, 100),
+        "is_boycotted": chunk["is_boycotted"].str.strip().str.lower().isin(TRUE_VALUES)
+        if "is_boycotted" in chunk.columns else False,
+        "country": column("country", "Unknown"),
+        "brand": column("brand", "Unknown"),
+    })
+    return cleaned.astype(object)[COLUMNS]
+
+
+def upsert_chunk(cursor, rows):
+    """Update products whose name already exists and insert the rest.
+
+    Names are not unique in the catalog (the CSV itself repeats some), so this
+    looks them up instead of relying on INSERT ... ON DUPLICATE KEY.
+    """
+    # Later rows of the chunk win, like a sequence of single-row upserts
+    latest = {}
+    for row in rows:
+        latest[row[0]] = row
+    names = list(latest)
+    existing = set()
+    for start in range(0, len(names), INSERT_BATCH_SIZE):
+        batch = names[start:start + INSERT_BATCH_SIZE]
+        cursor.execute(
+            f"SELECT DISTINCT name FROM products WHERE name IN ({', '.join(['%s'] * len(batch))})", batch
+        )
+        # MySQL compares names case-insensitively
+        existing.update(name.lower() for (name,) in cursor.fetchall())
+
+    updates = [row[1:] + (row[0],) for name, row in latest.items() if name.lower() in existing]
+    inserts = [row for name, row in latest.items() if name.lower() not in existing]
+    for start in range(0, len(updates), INSERT_BATCH_SIZE):
+        cursor.executemany(UPDATE_SQL, updates[start:start + INSERT_BATCH_SIZE])
+    for start in range(0, len(inserts), INSERT_BATCH_SIZE):
+        cursor.executemany(INSERT_SQL, inserts[start:start + INSERT_BATCH_SIZE])
+    return len(inserts), len(updates)
+
+
+def ingest(conn, cursor, path, mode, chunk_size=CHUNK_SIZE):
+    """Stream the CSV into products; returns (inserted, updated)."""
+    inserted = updated = uncommitted = 0
+    for chunk in read_chunks(path, chunk_size):
+        rows = list(clean_chunk(chunk).itertuples(index=False, name=None))
+        if mode == "upsert":
+            n_inserted, n_updated = upsert_chunk(cursor, rows)
+        else:
+            # executemany rewrites each batch into one multi-row INSERT
+            for start in range(0, len(rows), INSERT_BATCH_SIZE):
+                cursor.executemany(INSERT_SQL, rows[start:start + INSERT_BATCH_SIZE])
+            n_inserted, n_updated = len(rows), 0
+        inserted += n_inserted
+        updated += n_updated
+        uncommitted += len(rows)
+        if uncommitted >= COMMIT_EVERY:
+            conn.commit()
+            uncommitted = 0
+            print(f"Ingested {inserted + updated} rows...")
+    return inserted, updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create the database tables and load products from a CSV file.")
+    parser.add_argument("--file", default=DATA_PATH, help="CSV file to load (default: data/products.csv)")
+    parser.add_argument("--mode", choices=["recreate", "append", "upsert"], default="recreate",
+                        help="recreate: drop and recreate all tables (default); append: insert every row into "
+                             "the existing tables; upsert: update products with the same name, insert the rest")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="CSV rows read at a time")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"Error: CSV file not found. Please ensure '{args.file}' exists.")
+        exit(1)
+
+    try:
+        conn = mysql.connector.connect(
+            host="DB_HOST",
+            user="DB_USER",
+            password="DB_PASS",
+            database="DB_NAME"
+        )
+        cursor = conn.cursor()
+    except Error as e:
+        print(f"Error connecting to MySQL database: {e}. Ensure MySQL is running, 'recsys' database exists, and credentials are correct.")
+        exit(1)
+
+    if args.mode == "recreate":
+        recreate_tables(conn, cursor)
+
+    try:
+        inserted, updated = ingest(conn, cursor, args.file, args.mode, args.chunk_size)
+        # Let the API reload its catalog snapshot
+        cursor.execute("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+        conn.commit()
+        print(f"Successfully inserted {inserted} and updated {updated} products from {args.file}.")
+    except pd.errors.EmptyDataError:
+        print(f"Error: {args.file} is empty. Please check the contents.")
+        conn.rollback()
+        exit(1)
+    except pd.errors.ParserError as e:
+        print(f"Error: Unable to parse {args.file} - {e}. Check for correct formatting and headers.")
+        conn.rollback()
+        exit(1)
+    except KeyError as e:
+        print(f"Error: Missing column in CSV - {e}. Ensure CSV contains 'product_name' and optionally 'description', 'category', 'is_boycotted', 'country', 'brand'.")
+        conn.rollback()
+        exit(1)
+    except Error as e:
+        print(f"Error inserting data: {e}. Check for special characters or data mismatches. Rows after the last progress message were rolled back.")
+        conn.rollback()
+        exit(1)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -131,68 +131,53 @@ document.addEventListener('DOMContentLoaded', function() {
                 item.addEventListener('click', () => {
                     searchInput.value = product.name;
                     autocompleteList.innerHTML = '';
-                    searchProduct(product.product_id);
+                    searchProduct(product);
                 });
                 autocompleteList.appendChild(item);
             });
         });
     }
 
-    async function searchProduct(productId) {
+    // The clicked suggestion already carries the product, so only its
+    // boycott status and alternatives need fetching
+    async function searchProduct(product) {
         if (!resultDiv) return;
         resultDiv.innerHTML = '<div class="spinner"></div>جاري البحث عن المنتج...';
         try {
-            const response = await fetch(`/search_products?query=${encodeURIComponent(searchInput.value)}`);
-            if (!response.ok) {
-                throw new Error('خطأ في الاتصال بالخادم');
+            const simResponse = await fetch(`/process_image`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ name: product.name })
+            });
+
+            if (!simResponse.ok) {
+                throw new Error('خطأ في جلب البدائل');
             }
 
-            const data = await response.json();
-            if (data.error || !data.products.find(p => p.product_id === productId)) {
-                resultDiv.innerHTML = 'لم يتم العثور على المنتج. يرجى الذهاب إلى صفحة الإبلاغ لإضافته.';
+            const simData = await simResponse.json();
+            console.log('Full response (searchProduct):', simData); // Log full response for debugging
+            if (simData.error || !simData.detected_product) {
+                resultDiv.innerHTML = 'لم يتم التعرف على المنتج. يرجى الذهاب إلى صفحة الإبلاغ لإضافته.';
                 return;
             }
 
-            const product = data.products.find(p => p.product_id === productId);
-
-            try {
-                const simResponse = await fetch(`/process_image`, {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ name: product.name })
+            resultDiv.innerHTML = `✅ المنتج: ${product.name}`;
+            // Use is_boycotted from response
+            const boycotted = simData.is_boycotted !== undefined ? Boolean(simData.is_boycotted) : false; // Default to false if undefined
+            console.log('Processed boycotted value (searchProduct):', boycotted);
+            const statusText = boycotted ? 'مقاطعة' : 'غير مقاطعة';
+            const statusClass = boycotted ? 'boycotted' : 'non-boycotted';
+            resultDiv.innerHTML += `<span class="status-circle ${statusClass}">${statusText}</span>`;
+            if (simData.alternatives && simData.alternatives.length > 0) {
+                let html = '<h3>🟢 البدائل المقترحة:</h3><ul>';
+                simData.alternatives.forEach(alt => {
+                    html += `<li>${alt.name}</li>`;
                 });
-
-                if (!simResponse.ok) {
-                    throw new Error('خطأ في جلب البدائل');
-                }
-
-                const simData = await simResponse.json();
-                console.log('Full response (searchProduct):', simData); // Log full response for debugging
-                if (simData.error || !simData.detected_product) {
-                    resultDiv.innerHTML = 'لم يتم التعرف على المنتج. يرجى الذهاب إلى صفحة الإبلاغ لإضافته.';
-                    return;
-                }
-
-                resultDiv.innerHTML = `✅ المنتج: ${product.name}`;
-                // Use is_boycotted from response
-                const boycotted = simData.is_boycotted !== undefined ? Boolean(simData.is_boycotted) : false; // Default to false if undefined
-                console.log('Processed boycotted value (searchProduct):', boycotted);
-                const statusText = boycotted ? 'مقاطعة' : 'غير مقاطعة';
-                const statusClass = boycotted ? 'boycotted' : 'non-boycotted';
-                resultDiv.innerHTML += `<span class="status-circle ${statusClass}">${statusText}</span>`;
-                if (simData.alternatives && simData.alternatives.length > 0) {
-                    let html = '<h3>🟢 البدائل المقترحة:</h3><ul>';
-                    simData.alternatives.forEach(alt => {
-                        html += `<li>${alt.name}</li>`;
-                    });
-                    html += '</ul>';
-                    resultDiv.innerHTML += html;
-                }
-            } catch (error) {
-                resultDiv.innerHTML += `<p>خطأ في جلب البدائل: ${error.message}</p>`;
+                html += '</ul>';
+                resultDiv.innerHTML += html;
             }
         } catch (error) {
-            resultDiv.innerHTML = `خطأ: ${error.message}`;
+            resultDiv.innerHTML = `خطأ في جلب البدائل: ${error.message}`;
         }
     }
 